@@ -13,6 +13,8 @@ class AppConfig():
     CHANNELS: int = 1
     DEVICE: int = 3
     VAD_CHUNK_SIZE: int = 200
+    VAD_BATCH_FRAMES: int = 32  # 积压时单次批量送入 VAD 的最大帧数
+    VAD_ENERGY_PREGATE: bool = False  # 能量预门限：静音帧不调用 Silero（段边界可能与关闭时略有差异）
     SILENCE_THRESHOLD: int = 0.1
 
     # 模型路径
@@ -21,15 +23,57 @@ class AppConfig():
                        '-pytorch')
     PUNC_MODEL_PATH: str = (BASE_DIR / 'data/models/punc/punc_ct-transformer_cn-en-common-vocab471067-large')
     EMBEDDING_MODEL_PATH = (BASE_DIR / 'data/models/embedding/bge-small-zh-v1.5')
+    EMBEDDING_DIMENSION: int = 512  # 仅在无法从模型检测维度时使用
+
+    # 向量存储：qdrant（外部服务）或 local（进程内内存映射索引，无需 Qdrant）
+    VECTOR_STORE: str = "qdrant"
+    LOCAL_VECTOR_DIR: str = (BASE_DIR / 'data/vector_store')
 
     # Qdrant配置
     QDRANT_HOST: str = "localhost"
     QDRANT_PORT: int = 6333
     QDRANT_COLLECTION: str = "asr"
+    QDRANT_GRPC_PORT: int = 6334
+    QDRANT_PREFER_GRPC: bool = False
+    QDRANT_TIMEOUT: int = 10      # 请求超时（秒），同时用作连接池借出等待上限
+    QDRANT_POOL_SIZE: int = 4
 
     # 处理参数
-    BATCH_SIZE: int = 20
+    CHUNK_MAX_TOKENS: int = 500      # 向量化窗口的 token 上限（bge-small-zh 最长 512，含特殊符号）
+    CHUNK_OVERLAP_TOKENS: int = 64   # 相邻窗口重叠的 token 数
+    CHUNK_FLUSH_SECONDS: float = 30.0  # 新片段在窗口中停留超过该时长即输出
     QUEUE_MAXSIZE: int = 500
+    EMBED_BATCH_MAX: int = 32        # 嵌入线程单次最多攒批条数
+    EMBED_BATCH_WAIT_MS: int = 50    # 攒批最长等待时间（毫秒）
+    EMBED_INGEST_SLICE: int = 8      # 后台写入每次占用模型的最大条数（决定查询最坏等待）
+    QUERY_CACHE_SIZE: int = 256      # 查询向量 LRU 缓存条数，0 表示关闭
+    ANSWER_CACHE_SIZE: int = 128     # 语义回答缓存条数，0 表示关闭
+    ANSWER_CACHE_TTL_S: float = 600.0  # 回答缓存有效期（秒），0 表示不过期
+    ANSWER_CACHE_THRESHOLD: float = 0.95  # 问题向量余弦相似度不低于该值视为同一问题
+    ANSWER_REPLAY_CHARS: int = 16    # 流式接口回放缓存回答时每段的字符数
+    HYBRID_RETRIEVAL: bool = True    # 向量检索与 BM25 关键词检索按 RRF 融合
+    RRF_K: int = 60                  # RRF 平滑常数
+    QDRANT_UPSERT_WAIT: bool = False  # 批量写入是否等待 Qdrant 确认落盘（本地索引忽略此项，每批都提交）
+    TRANSCRIPT_FLUSH_EVERY: int = 1   # 每写入多少条 flush 一次（读者依赖及时可见）
+    TRANSCRIPT_FSYNC_EVERY: int = 20  # 每写入多少条 fsync 一次，0 表示仅在关闭时
+    TRANSCRIPT_STORE_SIZE: int = 500  # 进程内每个会话缓存的最近片段数
+
+    # 转写流水线（采集/VAD 与 ASR 解耦）
+    ASR_WORKERS: int = 2
+    ASR_MAX_CONCURRENT: int = 2  # 所有会话共用 ASR 模型时同时进行的推理数上限
+    RING_BUFFER_SECONDS: int = 120  # 共享内存环形缓冲区时长，需大于最长片段+ASR积压
+    ASR_BATCH_SIZE: int = 8  # 多个片段排队时单次批量推理的最大片段数
+    ASR_BATCH_MAX_SECONDS: float = 120.0  # 单个批次的音频总时长上限
+    ASR_PARTIAL_INTERVAL_S: float = 1.0  # 说话过程中临时结果的重解码间隔，0 表示关闭
+    PUNC_CONTEXT_CHARS: int = 20  # 标点推理时携带的上一片段末尾字符数
+    SEGMENT_QUEUE_MAXSIZE: int = 32
+
+    # Web 配置
+    MAX_SESSIONS: int = 4  # Web 端可同时录制的课程数
+    WEB_EXECUTOR_WORKERS: int = 8  # Web 层阻塞调用（录音控制、文件读取、检索）的线程池大小
+    TRANSCRIPT_STREAM_POLL_S: float = 5.0   # 转录推送在无通知时回退检查文件的间隔
+    TRANSCRIPT_STREAM_KEEPALIVE_S: float = 15.0  # 空闲连接的心跳间隔
+    TRANSCRIPT_STREAM_RETRY_MS: int = 2000  # 断线后浏览器重连等待时间
 
     # 日志配置
     LOG_LEVEL: str = "INFO"
@@ -14,7 +14,7 @@ from src.asr.recorder import AudioRecorder
 from src.asr.vad_processor import VADProcessor
 from src.asr.asr_processor import ASRProcessor
 from src.asr.punc_processor import PuncProcessor
-from src.embedding.embedding_manager import EmbeddingManager
+from src.embedding.embedding_manager import get_embedding_manager
 from src.llm.rag_processor import RAGProcessor
 from src.utils.logger import setup_logging
 from src.utils.file_utils import ensure_directory
@@ -22,7 +22,7 @@ from config.settings import config
 import argparse
 from threading import Thread
 from src.utils.file_utils import find_jsonl_file
-from tools import get_hotwords
+from src.asr.hotwords import get_hotwords
 
 
 def main():
@@ -59,7 +59,7 @@ def main():
             print("未匹配到热词，将不使用热词。")
         asr_processor = ASRProcessor(hotwords=hotwords)
         punc_processor = PuncProcessor()
-        embedding_manager = EmbeddingManager()
+        embedding_manager = get_embedding_manager()
 
         # 设置ASR处理器的标点处理器
         asr_processor.punc_processor = punc_processor
@@ -81,7 +81,7 @@ def main():
             asr_thread.start()
 
         if args.mode in ['qa', 'both']:
-            rag_processor = RAGProcessor()
+            rag_processor = RAGProcessor(embedding_manager=embedding_manager)
             # 查找最新的JSONL文件
 
             wait_for_new_session = args.mode == 'both' and recording_started_at is not None
@@ -1,4 +1,6 @@
-from typing import Optional
+from typing import Hashable, List, Optional
+import copy
+import threading
 from funasr import AutoModel
 from config.settings import config
 import numpy as np
@@ -10,12 +12,20 @@ logger = logging.getLogger(__name__)
 class ASRProcessor:
     """语音识别处理器"""
 
-    def __init__(self, hotwords):
+    def __init__(self, hotwords: Optional[List[str]] = None):
         self.model = None
         self.punc_processor: Optional[object] = None
         self.hotword_str = " ".join(hotwords) if hotwords else None
+        # 多个会话共用同一模型时，限制同时进行的推理数
+        self._inference_slots = threading.BoundedSemaphore(max(1, config.ASR_MAX_CONCURRENT))
         self._initialize_model()
 
+    def with_hotwords(self, hotwords: Optional[List[str]]) -> "ASRProcessor":
+        """返回共享模型、标点处理器与推理并发上限，仅热词不同的处理器（每个课程一个）"""
+        processor = copy.copy(self)
+        processor.hotword_str = " ".join(hotwords) if hotwords else None
+        return processor
+
     def _initialize_model(self):
         """初始化ASR模型"""
         try:
@@ -29,21 +39,106 @@ class ASRProcessor:
             logger.error(f"ASR模型加载失败: {e}")
             raise
 
-    def transcribe_audio(self, audio_data: np.ndarray) -> str:
-        """转录音频数据"""
+    @staticmethod
+    def _to_waveform(audio_data: np.ndarray) -> np.ndarray:
+        # 模型期望 int16 量级的浮点波形；环形缓冲区给出的 int16 视图无需再缩放
+        if audio_data.dtype == np.int16:
+            return audio_data.astype(np.float32)
+        return audio_data * 32768
+
+    def _punctuate(self, text: str) -> str:
+        if self.punc_processor and text:
+            try:
+                return self.punc_processor.add_punctuation(text)
+            except Exception as punc_error:
+                logger.warning("标点处理失败，将使用原始文本: %s", punc_error)
+        return text
+
+    def transcribe_audio(self, audio_data: np.ndarray, punctuate: bool = True) -> str:
+        """转录音频数据（punctuate=False 用于说话过程中的临时结果，跳过标点）"""
         if self.model is None:
             self._initialize_model()
         try:
-            result = self.model.inference(audio_data * 32768, hotword=self.hotword_str)
+            with self._inference_slots:
+                result = self.model.inference(self._to_waveform(audio_data), hotword=self.hotword_str)
             text = "".join(item["text"].replace(" ", "") for item in result)
-            if self.punc_processor and text:
-                try:
-                    text = self.punc_processor.add_punctuation(text)
-                except Exception as punc_error:
-                    logger.warning("标点处理失败，将使用原始文本: %s", punc_error)
+            if punctuate:
+                text = self._punctuate(text)
             print(f"识别结果:{text}")
             return text
         except Exception as e:
             logger.error(f"语音识别失败: {e}")
 
             return ""
+
+    def transcribe_batch(self, audios: List[np.ndarray], punctuate: bool = True,
+                         context_key: Optional[Hashable] = None) -> List[str]:
+        """批量转录：按时长分桶后成批送入模型，按输入顺序返回文本
+
+        context_key 标识一路连续的转写（如课程名），标点模型据此携带跨片段上下文，
+        同批的多个片段合并为一次标点推理。多个线程并发转写同一路时应传 punctuate=False，
+        再按时间顺序调用 punctuate_batch，否则上下文会按完成顺序推进。
+        """
+        if not audios:
+            return []
+        if self.model is None:
+            self._initialize_model()
+        if len(audios) == 1:
+            texts = [self.transcribe_audio(audios[0], punctuate=False)]
+        else:
+            texts = self._recognize_batch(audios)
+
+        if punctuate:
+            texts = self.punctuate_batch(texts, context_key=context_key)
+        return texts
+
+    def punctuate_batch(self, texts: List[str], context_key: Optional[Hashable] = None) -> List[str]:
+        """为一组连续片段加标点（失败时返回原文）"""
+        if not self.punc_processor or not any(texts):
+            return list(texts)
+        try:
+            return self.punc_processor.punctuate_batch(texts, context_key=context_key)
+        except Exception as punc_error:
+            logger.warning("标点处理失败，将使用原始文本: %s", punc_error)
+            return list(texts)
+
+    def _recognize_batch(self, audios: List[np.ndarray]) -> List[str]:
+        waveforms = [self._to_waveform(audio) for audio in audios]
+        texts = [""] * len(waveforms)
+        for bucket in self._length_buckets(waveforms):
+            try:
+                with self._inference_slots:
+                    result = self.model.inference(
+                        [waveforms[i] for i in bucket],
+                        hotword=self.hotword_str,
+                        batch_size=len(bucket),
+                    )
+                if len(result) != len(bucket):
+                    raise ValueError(f"批量结果数量不匹配: {len(result)} != {len(bucket)}")
+                for i, item in zip(bucket, result):
+                    texts[i] = item["text"].replace(" ", "")
+            except Exception as e:
+                logger.warning(f"批量识别失败，退回逐条识别: {e}")
+                for i in bucket:
+                    texts[i] = self.transcribe_audio(audios[i], punctuate=False)
+        return texts
+
+    @staticmethod
+    def _length_buckets(waveforms: List[np.ndarray]) -> List[List[int]]:
+        """按长度排序后切分批次，使同批片段时长接近、减少 padding"""
+        order = sorted(range(len(waveforms)), key=lambda i: waveforms[i].shape[0])
+        max_size = max(1, config.ASR_BATCH_SIZE)
+        max_samples = int(config.ASR_BATCH_MAX_SECONDS * config.SAMPLE_RATE)
+
+        buckets: List[List[int]] = []
+        current: List[int] = []
+        for i in order:
+            length = waveforms[i].shape[0]
+            # padding 后的批次大小约为 最长样本 × 条数
+            if current and (len(current) >= max_size or length * (len(current) + 1) > max_samples):
+                buckets.append(current)
+                current = []
+            current.append(i)
+        if current:
+            buckets.append(current)
+        return buckets
@@ -0,0 +1,11 @@
+from typing import List
+
+from config.settings import config
+
+
+def get_hotwords(lesson_name: str) -> List[str]:
+    """根据课名返回热词列表"""
+    for key, words in config.HOTWORDS_DICT.items():
+        if key in lesson_name:
+            return words
+    return []
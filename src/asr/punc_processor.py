@@ -1,16 +1,26 @@
 from funasr import AutoModel
 from funasr.utils.postprocess_utils import rich_transcription_postprocess
 from config.settings import config
+from pathlib import Path
+from typing import Dict, Hashable, List, Optional
+import threading
 import logging
 
 logger = logging.getLogger(__name__)
 
+PUNCTUATION_MARKS = set("，。？！、；：,.?!;:")
+
 
 class PuncProcessor:
-    """标点处理器"""
+    """标点处理器（跨片段保留左侧上下文，支持多片段合并为一次推理）"""
 
     def __init__(self):
         self.model = None
+        # 按会话保存上下文：普通模型为上一片段末尾的原始文本，VAD-realtime 模型为其自带 cache
+        self._contexts: Dict[Hashable, str] = {}
+        self._caches: Dict[Hashable, dict] = {}
+        self._lock = threading.Lock()
+        self._realtime = "vad_realtime" in Path(config.PUNC_MODEL_PATH).name
         self._initialize_model()
 
     def _initialize_model(self):
@@ -26,16 +36,77 @@ class PuncProcessor:
             logger.error(f"标点模型加载失败: {e}")
             raise
 
-    def add_punctuation(self, text: str) -> str:
+    def add_punctuation(self, text: str, context_key: Optional[Hashable] = None) -> str:
         """添加标点符号"""
+        return self.punctuate_batch([text], context_key=context_key)[0]
+
+    def punctuate_batch(self, texts: List[str], context_key: Optional[Hashable] = None) -> List[str]:
+        """为多个连续片段添加标点：拼接后一次推理，再按字符对齐拆回各片段"""
+        if not any(texts):
+            return list(texts)
         if self.model is None:
             self._initialize_model()
 
         try:
-            punc_input = " ".join(list(text))
-            punc_result = self.model.generate(input=punc_input)
+            if self._realtime:
+                return self._punctuate_with_cache(texts, context_key)
+
+            with self._lock:
+                context = self._contexts.get(context_key, "") if context_key is not None else ""
+            pieces = [context, *texts]
+            punc_result = self.model.generate(input="".join(pieces))
             final_text = rich_transcription_postprocess(punc_result[0]['text'])
-            return final_text
+
+            parts = self._split_aligned(final_text, pieces)
+            if parts is None:
+                raise ValueError("标点结果与输入无法对齐")
+
+            if context_key is not None:
+                with self._lock:
+                    self._contexts[context_key] = "".join(pieces)[-config.PUNC_CONTEXT_CHARS:]
+            return parts[1:]
         except Exception as e:
             logger.error(f"标点处理失败: {e}")
-            return text
\ No newline at end of file
+            return list(texts)
+
+    def _punctuate_with_cache(self, texts: List[str], context_key: Optional[Hashable]) -> List[str]:
+        """VAD-realtime 标点模型：由模型 cache 携带跨片段上下文"""
+        with self._lock:
+            cache = self._caches.setdefault(context_key, {}) if context_key is not None else {}
+        punc_result = self.model.generate(input="".join(texts), cache=cache)
+        final_text = rich_transcription_postprocess(punc_result[0]['text'])
+        parts = self._split_aligned(final_text, texts)
+        if parts is None:
+            raise ValueError("标点结果与输入无法对齐")
+        return parts
+
+    def reset_context(self, context_key: Hashable) -> None:
+        """清除指定会话的标点上下文"""
+        with self._lock:
+            self._contexts.pop(context_key, None)
+            self._caches.pop(context_key, None)
+
+    @staticmethod
+    def _is_content(ch: str) -> bool:
+        return not ch.isspace() and ch not in PUNCTUATION_MARKS
+
+    @classmethod
+    def _split_aligned(cls, output: str, pieces: List[str]) -> Optional[List[str]]:
+        """按各输入片段的有效字符数切分模型输出，片段后紧跟的标点归属该片段"""
+        counts = [sum(1 for ch in piece if cls._is_content(ch)) for piece in pieces]
+        parts: List[List[str]] = [[] for _ in pieces]
+        idx = 0
+        remaining = counts[0]
+        for ch in output:
+            if cls._is_content(ch):
+                while remaining == 0:
+                    idx += 1
+                    if idx >= len(pieces):
+                        return None
+                    remaining = counts[idx]
+                remaining -= 1
+            parts[idx].append(ch)
+
+        if remaining != 0 or any(counts[idx + 1:]):
+            return None
+        return ["".join(part).strip() for part in parts]
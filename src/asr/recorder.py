@@ -1,29 +1,77 @@
 import sounddevice as sd
 import numpy as np
-from typing import Optional, Callable
+from typing import List, Optional, Callable
 from config.settings import config
 import logging
 from pathlib import Path
-from ..utils.file_utils import BASE_DIR, ensure_directory, get_next_id, write_jsonl
+from ..utils.file_utils import BASE_DIR, ensure_directory
+from ..utils.transcript_store import transcript_store
+from ..utils.transcript_writer import TranscriptWriter
 from ..utils.time_utils import get_current_time, format_time
-from collections import deque
+from dataclasses import dataclass
+import datetime
 import threading
 from queue import Queue, Empty, Full
+from src.asr.ring_buffer import SharedRingBuffer
+from src.embedding.keyword_index import keyword_index
 from src.asr.vad_processor import VADProcessor
 
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class SegmentJob:
+    """待转写的语音片段"""
+    seq: int
+    start_offset: int  # 环形缓冲区中的样本偏移
+    end_offset: int
+    start_time: datetime.datetime
+    end_time: datetime.datetime
+    lesson_name: str
+    log_file: str
+    final: bool = True  # False 表示说话过程中的临时（partial）解码任务
+
+
 class AudioRecorder:
     """音频录制器"""
 
-    def __init__(self):
+    def __init__(self, asr_workers: Optional[int] = None, device: Optional[int] = None):
         self.stream = None
+        self.device = config.DEVICE if device is None else device
         self.is_recording = False
         self.log_file: Optional[str] = None
+        self.transcript_writer: Optional[TranscriptWriter] = None
         self.lesson_name: Optional[str] = None
-        self._cb_queue = Queue(maxsize=256)
+        self.block_size = 512
+        self.ring_buffer: Optional[SharedRingBuffer] = None
+        self._data_ready = threading.Event()
         self._overflow_warned = False
+        self._overrun_warned = False
+        self._capture_origin = (0, get_current_time())
+
+        # 分段队列：VAD 线程只负责切段入队，转写由独立的 ASR 工作线程完成
+        self.asr_workers = max(1, asr_workers or config.ASR_WORKERS)
+        self._segment_queue: Queue = Queue(maxsize=config.SEGMENT_QUEUE_MAXSIZE)
+        self._worker_threads = []
+        self._next_seq = 0
+        # 按入队顺序提交结果，保证多工作线程下 JSONL 的 id 与时间顺序一致
+        self._commit_cond = threading.Condition()
+        self._next_commit_seq = 0
+
+        # 转写结果订阅者：回调参数为带 final 标记的结果字典
+        self._listeners = []
+        self._partial_pending = False
+
+    def add_listener(self, callback: Callable[[dict], None]) -> None:
+        """订阅转写结果（临时结果 final=False，最终结果 final=True）"""
+        self._listeners.append(callback)
+
+    def _emit(self, event: dict) -> None:
+        for callback in list(self._listeners):
+            try:
+                callback(event)
+            except Exception as e:
+                logger.error(f"转写结果回调失败: {e}")
 
     def start_recording(self, vad_processor, asr_processor, embedding_manager, lesson_name: str):
         """开始录制和处理"""
@@ -32,113 +80,335 @@ class AudioRecorder:
         if vad_processor is None:
             vad_processor = VADProcessor()
 
-        with sd.InputStream(
-                samplerate=config.SAMPLE_RATE,
-                channels=config.CHANNELS,
-                dtype='float32',
-                device=config.DEVICE,
-                blocksize=512,
-                callback=self._audio_callback,
-        ) as stream:
-            self._recording_loop(stream, vad_processor, asr_processor, embedding_manager, lesson_name)
+        # 采集回调直接把 int16 写入共享内存环形缓冲区，VAD/ASR 按样本偏移读取
+        self.ring_buffer = SharedRingBuffer(int(config.RING_BUFFER_SECONDS * config.SAMPLE_RATE))
+        self._start_asr_workers(asr_processor, embedding_manager)
+        try:
+            with sd.RawInputStream(
+                    samplerate=config.SAMPLE_RATE,
+                    channels=config.CHANNELS,
+                    dtype='int16',
+                    device=self.device,
+                    blocksize=self.block_size,
+                    callback=self._audio_callback,
+            ) as stream:
+                self._recording_loop(stream, vad_processor, asr_processor, embedding_manager, lesson_name)
+        finally:
+            logger.info(f"VAD统计: {vad_processor.get_stats()}")
+            self._stop_asr_workers()
+            embedding_manager.flush_session(lesson_name)
+            self.ring_buffer.close()
+            self.ring_buffer = None
+            if self.transcript_writer is not None:
+                self.transcript_writer.close()
+                self.transcript_writer = None
+
+    def _start_asr_workers(self, asr_processor, embedding_manager):
+        """启动 ASR 工作线程池"""
+        self._next_seq = 0
+        self._next_commit_seq = 0
+        self._worker_threads = []
+        for idx in range(self.asr_workers):
+            thread = threading.Thread(
+                target=self._asr_worker,
+                args=(asr_processor, embedding_manager),
+                name=f"ASRWorker-{idx}",
+                daemon=True,
+            )
+            thread.start()
+            self._worker_threads.append(thread)
+
+    def _stop_asr_workers(self):
+        """等待已入队片段转写完成后停止工作线程"""
+        for _ in self._worker_threads:
+            self._segment_queue.put(None)
+        for thread in self._worker_threads:
+            thread.join()
+        self._worker_threads = []
+
+    def _asr_worker(self, asr_processor, embedding_manager):
+        """ASR工作线程：从分段队列取片段并转写；多个片段排队时批量送入模型"""
+        while True:
+            job = self._segment_queue.get()
+            jobs = [job]
+            stop = job is None
+            if job is not None and job.final:
+                while len(jobs) < max(1, config.ASR_BATCH_SIZE):
+                    try:
+                        pending = self._segment_queue.get_nowait()
+                    except Empty:
+                        break
+                    jobs.append(pending)
+                    if pending is None:
+                        # 每个工作线程只消费一个停止信号
+                        stop = True
+                        break
+            try:
+                finals = [j for j in jobs if j is not None and j.final]
+                if finals:
+                    self._process_final_batch(finals, asr_processor, embedding_manager)
+                for partial in (j for j in jobs if j is not None and not j.final):
+                    self._process_partial(partial, asr_processor)
+            except Exception as e:
+                logger.error(f"ASR工作线程异常: {e}")
+            finally:
+                for _ in jobs:
+                    self._segment_queue.task_done()
+            if stop:
+                break
 
     def _recording_loop(self, stream, vad_processor, asr_processor, embedding_manager, lesson_name: str):
         """录制循环"""
 
-        audio_chunk = []
+        ring = self.ring_buffer
+        block = self.block_size
         speaking = False
         silence_start = get_current_time()
         speaking_start = None
-        prev_chunk_stride = int(0.2 * config.SAMPLE_RATE / 512)
-        prev_audio_chunk = deque(maxlen=prev_chunk_stride)
+        pre_roll = int(0.2 * config.SAMPLE_RATE / block) * block
+        seg_start_offset = None
+        last_end_offset = 0
+        partial_step = int(config.ASR_PARTIAL_INTERVAL_S * config.SAMPLE_RATE)
+        last_partial_offset = 0
 
         log_dir = Path(BASE_DIR) / "data" / "outputs" / "json"
         ensure_directory(str(log_dir))
         log_file_path = log_dir / f"{format_time(get_current_time(), '%Y-%m-%d_%H-%M-%S')}.jsonl"
         self.log_file = str(log_file_path)
+        self.transcript_writer = TranscriptWriter(self.log_file)
+        transcript_store.open_session(lesson_name, self.log_file)
+        keyword_index.reset_session(lesson_name)
 
+        read_pos = ring.write_pos
+        self._capture_origin = (read_pos, get_current_time())
         while self.is_recording:
-            samples = None
-            # 等队列有数据；不给死等，避免无法停机
-            try:
-                samples = self._cb_queue.get(timeout=0.01)  # 最多等10ms
-            except Empty:
+            # 等缓冲区有完整一帧；不给死等，避免无法停机
+            if ring.write_pos - read_pos < block:
+                self._data_ready.wait(timeout=0.01)  # 最多等10ms
+                self._data_ready.clear()
                 continue
 
-            speech_dict = vad_processor.process_samples(samples)
+            if read_pos < ring.oldest():
+                if not self._overrun_warned:
+                    logger.warning("VAD 处理落后于采集，部分音频已被覆盖（同类警告仅提示一次）")
+                    self._overrun_warned = True
+                read_pos = ring.oldest()
 
-            if speech_dict and 'start' in speech_dict:
-                if not speaking:
-                    speaking = True
-                    audio_chunk = []
-                    if silence_start is not None:
-                        speaking_start = get_current_time()
-                        logger.info(f"静音区间[{format_time(silence_start)[-8:]}-{format_time(speaking_start)[-8:]}]")
-                        silence_start = None
+            # 有积压时一次取出多帧批量送入 VAD，否则逐帧处理
+            n_frames = min((ring.write_pos - read_pos) // block, max(1, config.VAD_BATCH_FRAMES))
+            base_offset = read_pos
+            frames = ring.read(base_offset, base_offset + n_frames * block).reshape(n_frames, block)
+            read_pos += n_frames * block
 
-            if speaking:
-                audio_chunk.append(samples)
+            if n_frames > 1:
+                events = vad_processor.process_frames(frames)
             else:
-                prev_audio_chunk.append(samples)
-
-            if speech_dict and 'end' in speech_dict:
-                speaking = False
-                if speaking_start is not None:
-                    silence_start = get_current_time()
-                    logger.info(f"说话区间[{format_time(speaking_start)[-8:]}-{format_time(silence_start)[-8:]}]")
-
-                self._process_audio_segment(
-                    prev_audio_chunk,
-                    audio_chunk,
-                    speaking_start,
-                    silence_start,
-                    asr_processor,
-                    embedding_manager,
-                    lesson_name,
-                    self.log_file,
-                )
-
-                speaking_start = None
-                audio_chunk = []
-
-    def _process_audio_segment(self, prev_chunk, current_chunk, start_time, end_time,
-                               asr_processor, embedding_manager, lesson_name, log_file):
-        """处理音频片段"""
+                events = [vad_processor.process_samples(frames[0])]
+
+            for i, speech_dict in enumerate(events):
+                if not speech_dict:
+                    continue
+                frame_offset = base_offset + i * block
+
+                if 'start' in speech_dict:
+                    if not speaking:
+                        speaking = True
+                        # 前滚：带上起点之前约 200ms 的音频，但不与上一段重叠
+                        seg_start_offset = max(frame_offset - pre_roll, last_end_offset, ring.oldest())
+                        last_partial_offset = frame_offset
+                        if silence_start is not None:
+                            speaking_start = self._offset_to_time(frame_offset)
+                            logger.info(f"静音区间[{format_time(silence_start)[-8:]}-{format_time(speaking_start)[-8:]}]")
+                            silence_start = None
+
+                if 'end' in speech_dict:
+                    speaking = False
+                    end_offset = frame_offset + block
+                    if speaking_start is not None:
+                        silence_start = self._offset_to_time(end_offset)
+                        logger.info(f"说话区间[{format_time(speaking_start)[-8:]}-{format_time(silence_start)[-8:]}]")
+
+                    self._enqueue_segment(
+                        seg_start_offset,
+                        end_offset,
+                        speaking_start,
+                        silence_start,
+                        lesson_name,
+                        self.log_file,
+                    )
+                    last_end_offset = end_offset
+
+                    speaking_start = None
+                    seg_start_offset = None
+
+            # 说话过程中按固定间隔对不断增长的片段重解码，输出临时结果
+            if (speaking and partial_step > 0 and speaking_start is not None
+                    and read_pos - last_partial_offset >= partial_step):
+                self._enqueue_partial(seg_start_offset, read_pos, speaking_start, lesson_name, self.log_file)
+                last_partial_offset = read_pos
+
+    def _offset_to_time(self, offset: int) -> datetime.datetime:
+        """按样本偏移换算墙钟时间（批量处理积压帧时仍能得到准确的起止时间）"""
+        origin_offset, origin_time = self._capture_origin
+        return origin_time + datetime.timedelta(seconds=(offset - origin_offset) / config.SAMPLE_RATE)
+
+    def _enqueue_segment(self, start_offset, end_offset, start_time, end_time, lesson_name, log_file):
+        """将切好的片段（样本偏移）放入分段队列（队列满时阻塞，形成背压）"""
 
         if start_time is None or end_time is None:
             return
 
-        if not prev_chunk and not current_chunk:
+        if start_offset is None or end_offset <= start_offset:
+            return
+
+        job = SegmentJob(
+            seq=self._next_seq,
+            start_offset=start_offset,
+            end_offset=end_offset,
+            start_time=start_time,
+            end_time=end_time,
+            lesson_name=lesson_name,
+            log_file=log_file,
+        )
+        self._next_seq += 1
+
+        if self._segment_queue.full():
+            logger.warning("分段队列已满，等待ASR工作线程处理")
+        self._segment_queue.put(job)
+
+    def _enqueue_partial(self, start_offset, end_offset, start_time, lesson_name, log_file):
+        """提交临时解码任务；队列繁忙或上一次临时解码未完成时直接跳过，不影响最终结果"""
+        if self._partial_pending or start_offset is None or end_offset <= start_offset:
             return
 
-        audio = np.concatenate([*list(prev_chunk), *current_chunk], axis=0)
+        job = SegmentJob(
+            seq=self._next_seq,  # 与该片段结束后最终任务的序号相同
+            start_offset=start_offset,
+            end_offset=end_offset,
+            start_time=start_time,
+            end_time=self._offset_to_time(end_offset),
+            lesson_name=lesson_name,
+            log_file=log_file,
+            final=False,
+        )
+        try:
+            self._partial_pending = True
+            self._segment_queue.put_nowait(job)
+        except Full:
+            self._partial_pending = False
+
+    def _read_segment(self, job: SegmentJob) -> Optional[np.ndarray]:
+        """从环形缓冲区读取片段音频（int16 视图）"""
+        ring = self.ring_buffer
+        start = job.start_offset
+        if start < ring.oldest():
+            logger.warning("片段开头已被环形缓冲区覆盖，请调大 RING_BUFFER_SECONDS")
+            start = ring.oldest()
+        if start >= job.end_offset:
+            return None
+        return ring.read(start, job.end_offset)
+
+    def _process_final_batch(self, jobs: List[SegmentJob], asr_processor, embedding_manager):
+        """处理一批音频片段（jobs 按序号升序）"""
+
+        texts: List[Optional[str]] = [None] * len(jobs)
+        try:
+            audios = [self._read_segment(job) for job in jobs]
+            valid = [i for i, audio in enumerate(audios) if audio is not None]
+            # 语音识别（可与其它工作线程并行；多个片段时按长度分桶批量推理）
+            # 标点依赖上一片段的上下文，留到按序提交时再做
+            results = asr_processor.transcribe_batch([audios[i] for i in valid], punctuate=False)
+            for i, text in zip(valid, results):
+                texts[i] = text
+                logger.info(f"识别结果: {text}")
+        except Exception as e:
+            logger.error(f"音频处理失败: {e}")
+
+        # 其它工作线程可能取走了中间的片段，按连续序号分段提交
+        start = 0
+        for i in range(1, len(jobs) + 1):
+            if i == len(jobs) or jobs[i].seq != jobs[i - 1].seq + 1:
+                self._commit_in_order(jobs[start:i], texts[start:i], asr_processor, embedding_manager)
+                start = i
+
+    def _commit_in_order(self, jobs: List[SegmentJob], texts: List[Optional[str]], asr_processor,
+                         embedding_manager):
+        """按入队顺序依次加标点并提交（jobs 序号连续）
+
+        标点模型按课程保存跨片段上下文（VAD-realtime 模型为其 cache），在提交锁内执行
+        才能保证上下文按时间顺序推进，且同一 cache 不会被两个工作线程同时使用。
+        """
+        with self._commit_cond:
+            self._commit_cond.wait_for(lambda: self._next_commit_seq == jobs[0].seq)
+            try:
+                spoken = [i for i, text in enumerate(texts) if text]
+                if spoken:
+                    punctuated = asr_processor.punctuate_batch(
+                        [texts[i] for i in spoken], context_key=jobs[0].lesson_name
+                    )
+                    texts = list(texts)
+                    for i, text in zip(spoken, punctuated):
+                        texts[i] = text
+                for job, text in zip(jobs, texts):
+                    if text is not None:
+                        self._commit_segment(job, text, embedding_manager)
+            finally:
+                self._next_commit_seq = jobs[-1].seq + 1
+                self._commit_cond.notify_all()
 
+    def _process_partial(self, job: SegmentJob, asr_processor):
+        """临时解码：不加标点、不落盘，仅通知订阅者"""
         try:
-            # 语音识别
-            text = asr_processor.transcribe_audio(audio)
-            logger.info(f"识别结果: {text}")
+            # 该片段已结束并提交了最终任务，临时结果已无意义
+            if self._next_seq > job.seq:
+                return
+            audio = self._read_segment(job)
+            if audio is None:
+                return
+            text = asr_processor.transcribe_audio(audio, punctuate=False)
+            if not text or self._next_seq > job.seq:
+                return
+            self._emit({
+                "final": False,
+                "segment_seq": job.seq,
+                "session_id": job.lesson_name,
+                "type": "speech",
+                "start": int(job.start_time.timestamp()),
+                "start_str": job.start_time.isoformat(),
+                "text": text,
+                "dur": round((job.end_time - job.start_time).total_seconds(), 2),
+            })
+        finally:
+            self._partial_pending = False
 
-            # 准备数据
-            id_val = get_next_id(log_file)
-            duration = round((end_time - start_time).total_seconds(), 2)
+    def _commit_segment(self, job: SegmentJob, text: str, embedding_manager):
+        """写入转写结果并加入嵌入队列"""
+        try:
+            # 准备数据（id 由写入器分配）
+            duration = round((job.end_time - job.start_time).total_seconds(), 2)
 
-            json_data = {
-                "id": id_val,
-                "session_id": lesson_name,
+            row = {
+                "session_id": job.lesson_name,
                 "type": "speech",
-                "start": int(start_time.timestamp()),
-                "end": int(end_time.timestamp()),
-                "start_str": start_time.isoformat(),
-                "end_str": end_time.isoformat(),
+                "start": int(job.start_time.timestamp()),
+                "end": int(job.end_time.timestamp()),
+                "start_str": job.start_time.isoformat(),
+                "end_str": job.end_time.isoformat(),
                 "text": text,
                 "dur": duration,
+                "final": True,
             }
 
-            # 写入文件
-            write_jsonl(log_file, json_data)
+            # 只有最终结果写入文件，临时结果不会进入 JSONL
+            json_data = self.transcript_writer.append(row)
+            id_val = json_data["id"]
+            transcript_store.publish(json_data)
+            keyword_index.add(json_data)
 
             # 加入嵌入队列
-            embedding_manager.enqueue_for_embedding(text, json_data, lesson_name, id_val)
+            embedding_manager.enqueue_for_embedding(text, json_data, job.lesson_name, id_val)
+
+            self._emit({**json_data, "segment_seq": job.seq})
 
         except Exception as e:
             logger.error(f"音频处理失败: {e}")
@@ -147,17 +417,12 @@ class AudioRecorder:
         if status and status.input_overflow and not self._overflow_warned:
             logger.warning("检测到缓冲区溢出（同类警告仅提示一次）")
             self._overflow_warned = True
-        if indata.ndim == 2:
-            indata = indata[:, 0]
 
-        try:
-            self._cb_queue.put_nowait(indata.copy())
-        except Full:
-            try:
-                self._cb_queue.get_nowait()
-                self._cb_queue.put_nowait(indata.copy())
-            except Exception:
-                pass
+        samples = np.frombuffer(indata, dtype=np.int16)
+        if config.CHANNELS > 1:
+            samples = samples.reshape(-1, config.CHANNELS)[:, 0]
+        self.ring_buffer.write(samples)
+        self._data_ready.set()
 
     def stop_recording(self):
         """停止录制"""
@@ -0,0 +1,90 @@
+from multiprocessing import shared_memory
+from typing import Optional
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class SharedRingBuffer:
+    """基于 shared_memory 的 int16 音频环形缓冲区（单写多读）
+
+    内存布局：前 8 字节为 int64 写指针（样本索引，单调递增），其后为 int16 样本。
+    读者按样本偏移读取片段，未跨越环尾时直接返回视图，不产生拷贝；
+    其它进程可通过 ``attach(name, capacity)`` 挂载同一块内存读取音频。
+    """
+
+    HEADER_BYTES = 8
+
+    def __init__(self, capacity: int, name: Optional[str] = None, create: bool = True):
+        self.capacity = int(capacity)
+        self._owner = create
+        size = self.HEADER_BYTES + self.capacity * np.dtype(np.int16).itemsize
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=size if create else 0)
+        self._wptr = np.ndarray((1,), dtype=np.int64, buffer=self.shm.buf, offset=0)
+        self.buf = np.ndarray((self.capacity,), dtype=np.int16, buffer=self.shm.buf, offset=self.HEADER_BYTES)
+        if create:
+            self._wptr[0] = 0
+
+    @classmethod
+    def attach(cls, name: str, capacity: int) -> "SharedRingBuffer":
+        """挂载其它进程创建的缓冲区（只读使用）"""
+        return cls(capacity, name=name, create=False)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @property
+    def write_pos(self) -> int:
+        """已写入的样本总数（单调递增）"""
+        return int(self._wptr[0])
+
+    def oldest(self) -> int:
+        """仍可读取的最早样本偏移"""
+        return max(0, self.write_pos - self.capacity)
+
+    def write(self, samples: np.ndarray) -> None:
+        """写入一块样本；数据落盘后再推进写指针，读者不会读到半块数据"""
+        n = samples.shape[0]
+        if n == 0:
+            return
+        if n > self.capacity:
+            samples = samples[-self.capacity:]
+            self._wptr[0] += n - self.capacity
+            n = self.capacity
+
+        wp = self.write_pos % self.capacity
+        tail = self.capacity - wp
+        if n <= tail:
+            self.buf[wp:wp + n] = samples
+        else:
+            self.buf[wp:] = samples[:tail]
+            self.buf[:n - tail] = samples[tail:]
+        self._wptr[0] += n
+
+    def read(self, start: int, end: int) -> np.ndarray:
+        """读取 [start, end) 区间的样本；未跨越环尾时返回视图，否则拼接返回副本"""
+        if start < self.oldest():
+            raise ValueError(f"样本区间已被覆盖: start={start}, oldest={self.oldest()}")
+        if end > self.write_pos or end < start:
+            raise ValueError(f"样本区间无效: [{start}, {end}), write_pos={self.write_pos}")
+
+        s = start % self.capacity
+        n = end - start
+        if s + n <= self.capacity:
+            return self.buf[s:s + n]
+        first = self.capacity - s
+        return np.concatenate((self.buf[s:], self.buf[:n - first]))
+
+    def close(self) -> None:
+        """释放共享内存（创建者负责 unlink）"""
+        # 先释放 numpy 视图，否则 SharedMemory.close 会因导出缓冲区而失败
+        self._wptr = None
+        self.buf = None
+        try:
+            self.shm.close()
+            if self._owner:
+                self.shm.unlink()
+        except Exception as e:
+            logger.warning(f"释放共享内存失败: {e}")
@@ -4,6 +4,7 @@ import logging
 import numpy as np
 import torch
 from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional
 
 logger = logging.getLogger(__name__)
 
@@ -21,13 +22,17 @@ class VadCfg:
     noise_ewma: float = 0.995  # 噪声底跟踪平滑系数（越接近1越平滑）
     clamp_db_floor: float = -60.0  # 能量下限（防止log过小）
     silero_prob_thr: float = 0.5   # Silero 概率阈值（与能量双门限 AND）
+    # 级联模式：能量门限未通过且不在说话时跳过 Silero。Silero 在帧间携带 RNN 状态与 64 样本上下文，
+    # 跳过后再次调用前会重置其状态，因此门限重新打开后的前几帧概率与非级联模式不完全相同，
+    # 段边界可能有一两帧的差异；需要与非级联模式逐帧一致时请关闭
+    energy_pregate: bool = False
 
 
 class VADProcessor:
     """VAD处理器（Silero 概率 + 能量双门限，带迟滞/前后滚）"""
 
     def __init__(self, cfg: VadCfg | None = None):
-        self.cfg = cfg or VadCfg(sr=config.SAMPLE_RATE, block=512)
+        self.cfg = cfg or VadCfg(sr=config.SAMPLE_RATE, block=512, energy_pregate=config.VAD_ENERGY_PREGATE)
         self.vad = None
         self._initialize_vad()
 
@@ -39,6 +44,12 @@ class VADProcessor:
         self.noise_db = -50.0
         self.post_hang = 0  # 计数用于后滚
 
+        # 级联模式统计：实际调用 / 跳过 Silero 的帧数
+        self.silero_calls = 0
+        self.silero_skipped = 0
+        self.silero_resets = 0
+        self._silero_stale = False  # 跳过过帧，Silero 内部状态已不连续
+
         # 预先算好帧到毫秒的换算
         self.ms_per_frame = 1000.0 * self.cfg.block / self.cfg.sr
         self.pre_frames = max(0, int(round(self.cfg.pre_roll_ms / self.ms_per_frame)))
@@ -57,11 +68,18 @@ class VADProcessor:
             logger.error(f"VAD模型加载失败: {e}")
             raise
 
+    # —— 工具：统一为 [-1, 1] 的 float32（兼容环形缓冲区的 int16 视图） ——
+    @staticmethod
+    def _to_float32(x: np.ndarray) -> np.ndarray:
+        if x.dtype == np.int16:
+            return x.astype(np.float32) / 32768.0
+        return x.astype(np.float32)
+
     # —— 工具：计算一帧的RMS dB（单声道） ——
     def _frame_db(self, x: np.ndarray) -> float:
         if x.ndim == 2:
             x = x[:, 0]
-        rms = np.sqrt(np.mean(x.astype(np.float32) ** 2) + 1e-12)
+        rms = np.sqrt(np.mean(self._to_float32(x) ** 2) + 1e-12)
         db = 20.0 * np.log10(max(rms, 1e-6))
         return max(db, self.cfg.clamp_db_floor)
 
@@ -71,36 +89,79 @@ class VADProcessor:
         if x.ndim == 2:
             x = x[:, 0]
         with torch.no_grad():
-            t = torch.from_numpy(x.astype(np.float32))
-            # 部分 silero 实现是 (waveform, sr) 或 (waveform, sample_rate=)
-            # 这里按常见签名：vad(waveform, sr)
-            p = self.vad(t, self.cfg.sr)
-            # 返回标量概率
-            if isinstance(p, (list, tuple)):
-                p = p[0]
-            if isinstance(p, torch.Tensor):
-                p = p.item()
-            return float(p)
+            return self._silero_forward(torch.from_numpy(self._to_float32(x)))
+
+    def _silero_forward(self, t: torch.Tensor) -> float:
+        # 部分 silero 实现是 (waveform, sr) 或 (waveform, sample_rate=)
+        # 这里按常见签名：vad(waveform, sr)；调用方负责 no_grad 上下文
+        p = self.vad(t, self.cfg.sr)
+        # 返回标量概率
+        if isinstance(p, (list, tuple)):
+            p = p[0]
+        if isinstance(p, torch.Tensor):
+            p = p.item()
+        return float(p)
+
+    # —— 工具：向量化计算多帧的RMS dB，frames 形状 (n, block) ——
+    def _frames_db(self, frames: np.ndarray) -> np.ndarray:
+        x = self._to_float32(frames)
+        rms = np.sqrt(np.mean(x ** 2, axis=1) + 1e-12)
+        db = 20.0 * np.log10(np.maximum(rms, 1e-6))
+        return np.maximum(db, self.cfg.clamp_db_floor)
 
     def process_samples(self, samples: np.ndarray):
         """
-        输入：一帧样本 (block, 1或block,)
+        输入：一帧样本 (block, 1或block,)，float32 或 int16
         输出：None / {'start': True} / {'end': True}
         """
         # 递增帧号
         self.frame_idx += 1
 
-        # 计算本帧能量与 Silero 概率
+        # 计算本帧能量；Silero 概率按需计算
         db = self._frame_db(samples)
-        prob = self._silero_prob(samples)
+        return self._step(db, lambda: self._silero_prob(samples))
+
+    def process_frames(self, frames: np.ndarray) -> List[Optional[dict]]:
+        """
+        批量模式：输入连续的多帧 (n, block)，float32 或 int16
+        输出：与逐帧调用 process_samples 相同的事件列表（每帧一个 None / {'start': True} / {'end': True}）
+        """
+        if frames.ndim == 1:
+            frames = frames.reshape(-1, self.cfg.block)
+        if frames.shape[0] == 0:
+            return []
 
+        dbs = self._frames_db(frames)
+
+        # Silero 是有状态模型（内部 RNN 状态随帧推进），同一路音频的帧不能作为独立 batch 并行，
+        # 这里保持时序逐帧前向，但只做一次张量转换、只进入一次 no_grad 上下文
+        events = []
+        with torch.no_grad():
+            t = torch.from_numpy(self._to_float32(frames))
+            for i, db in enumerate(dbs):
+                self.frame_idx += 1
+                events.append(self._step(float(db), lambda i=i: self._silero_forward(t[i])))
+        return events
+
+    def _step(self, db: float, prob_fn: Callable[[], float]):
+        """迟滞状态机：根据一帧的能量与概率推进状态（prob_fn 惰性计算 Silero 概率）"""
         # 自适应噪声底（仅在“非说话状态”下跟踪，避免被语音抬高）
         if not self.in_speech:
             self.noise_db = self.cfg.noise_ewma * self.noise_db + (1.0 - self.cfg.noise_ewma) * db
 
         # 双门限：能量相对噪声底 + Silero 概率
         energy_ok = (db >= self.noise_db + self.cfg.thr_db_above)
-        silero_ok = (prob >= self.cfg.silero_prob_thr)
+        if self.cfg.energy_pregate and not energy_ok and not self.in_speech:
+            # 级联：能量门限未通过时 AND 结果必为 False，无需调用模型
+            self.silero_skipped += 1
+            self._silero_stale = True
+            silero_ok = False
+        else:
+            if self._silero_stale:
+                # 跳过的帧没有推进 RNN 状态，与其用过期状态打分，不如从干净状态重新开始
+                self._reset_silero_state()
+            self.silero_calls += 1
+            silero_ok = (prob_fn() >= self.cfg.silero_prob_thr)
         voiced = energy_ok and silero_ok
 
         # 迟滞计数
@@ -129,3 +190,21 @@ class VADProcessor:
                     return {'end': True}
 
         return None
+
+    def _reset_silero_state(self) -> None:
+        reset = getattr(self.vad, "reset_states", None)
+        if reset is not None:
+            reset()
+        self.silero_resets += 1
+        self._silero_stale = False
+
+    def get_stats(self) -> Dict[str, float]:
+        """返回级联模式下 Silero 调用/跳过/状态重置统计"""
+        total = self.silero_calls + self.silero_skipped
+        return {
+            "frames": total,
+            "silero_calls": self.silero_calls,
+            "silero_skipped": self.silero_skipped,
+            "silero_resets": self.silero_resets,
+            "skip_ratio": round(self.silero_skipped / total, 4) if total else 0.0,
+        }
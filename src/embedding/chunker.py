@@ -0,0 +1,117 @@
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+import re
+import time
+
+from config.settings import config
+
+_CJK = re.compile(r"[㐀-鿿]")
+_WORD = re.compile(r"[A-Za-z0-9]+")
+
+
+def estimate_tokens(text: str) -> int:
+    """无分词器时的估算：每个汉字约一个 token，英文/数字按词约 1.3 个 token"""
+    words = _WORD.findall(text)
+    return len(_CJK.findall(text)) + sum(max(1, round(len(w) / 4 * 1.3)) for w in words)
+
+
+@dataclass
+class _PendingSegment:
+    segment_id: int
+    text: str
+    start: Optional[float]
+    end: Optional[float]
+    tokens: int
+    added_at: float
+
+
+class SlidingWindowChunker:
+    """按 token 预算切分转录片段的滑动窗口
+
+    片段依次加入，窗口凑满 max_tokens 时输出，并保留末尾不超过 overlap_tokens 的片段作为
+    下一窗口的开头；说话停顿超过 flush_seconds 时，尚未输出的新片段也会被输出，避免尾部
+    片段一直停留在缓冲区。每个窗口记录其包含的片段 id，只有新窗口需要向量化。
+    """
+
+    def __init__(
+            self,
+            session_id: str,
+            count_tokens: Callable[[str], int] = estimate_tokens,
+            max_tokens: Optional[int] = None,
+            overlap_tokens: Optional[int] = None,
+            flush_seconds: Optional[float] = None,
+    ):
+        self.session_id = session_id
+        self.count_tokens = count_tokens
+        self.max_tokens = max_tokens or config.CHUNK_MAX_TOKENS
+        self.overlap_tokens = min(
+            overlap_tokens if overlap_tokens is not None else config.CHUNK_OVERLAP_TOKENS,
+            self.max_tokens // 2,
+        )
+        self.flush_seconds = flush_seconds if flush_seconds is not None else config.CHUNK_FLUSH_SECONDS
+        self.window_index = 1
+        self._pending: List[_PendingSegment] = []
+        self._fresh = 0  # 缓冲区中尚未进入任何窗口的片段数
+
+    @property
+    def _pending_tokens(self) -> int:
+        return sum(item.tokens for item in self._pending)
+
+    def add(self, segment_id: int, text: str, start=None, end=None) -> List[dict]:
+        """加入一个片段，返回因此凑满的窗口"""
+        text = (text or "").strip()
+        if not text:
+            return []
+        item = _PendingSegment(segment_id, text, start, end, self.count_tokens(text), time.monotonic())
+        windows = []
+        if self._fresh and self._pending_tokens + item.tokens > self.max_tokens:
+            windows.append(self._emit())
+        # 重叠部分与新片段放不下时，从最旧的重叠片段开始丢弃
+        while self._pending and not self._fresh and self._pending_tokens + item.tokens > self.max_tokens:
+            self._pending.pop(0)
+        self._pending.append(item)
+        self._fresh += 1
+        if self._pending_tokens >= self.max_tokens:
+            windows.append(self._emit())
+        return windows
+
+    def flush(self, force: bool = False) -> List[dict]:
+        """输出停顿超时（或 force 时全部）的新片段"""
+        if not self._fresh:
+            return []
+        oldest_fresh = self._pending[-self._fresh].added_at
+        if force or time.monotonic() - oldest_fresh >= self.flush_seconds:
+            return [self._emit()]
+        return []
+
+    def _emit(self) -> dict:
+        items = self._pending
+        starts = [item.start for item in items if item.start is not None]
+        ends = [item.end for item in items if item.end is not None]
+        first_start = int(min(starts)) if starts else None
+        last_end = int(max(ends)) if ends else None
+        window = {
+            "type": "batch_speech",
+            "session_id": self.session_id,
+            "batch_index": self.window_index,
+            "count": len(items),
+            "segment_ids": [item.segment_id for item in items],
+            "tokens": sum(item.tokens for item in items),
+            "start": first_start,
+            "end": last_end,
+            "dur": round(last_end - first_start, 2) if first_start is not None and last_end is not None else 0.0,
+            "combined_text": "".join(item.text for item in items),
+        }
+        self.window_index += 1
+
+        # 末尾片段作为下一个窗口的重叠部分
+        carried: List[_PendingSegment] = []
+        budget = self.overlap_tokens
+        for item in reversed(items):
+            if item.tokens > budget:
+                break
+            carried.insert(0, item)
+            budget -= item.tokens
+        self._pending = carried
+        self._fresh = 0
+        return window
@@ -1,11 +1,15 @@
 from langchain_huggingface import HuggingFaceEmbeddings
 from config.settings import config
-from src.embedding.qdrant_client import QdrantManager
+from src.embedding.chunker import SlidingWindowChunker, estimate_tokens
+from src.embedding.query_cache import QueryEmbeddingCache
+from src.embedding.scheduler import EmbeddingScheduler, LANE_INGEST, LANE_INTERACTIVE
+from src.embedding.vector_store import create_vector_store
 import threading
 import queue
 import logging
+import time
+from typing import Dict, List, Optional
 from uuid import uuid5, NAMESPACE_DNS
-from qdrant_client.models import Filter, FieldCondition, MatchValue
 
 logger = logging.getLogger(__name__)
 
@@ -15,11 +19,20 @@ class EmbeddingManager:
 
     def __init__(self):
         self.embedding_model = None
-        self.qdrant_manager = QdrantManager()
+        self.vector_store = None
         self.task_queue = queue.Queue(maxsize=config.QUEUE_MAXSIZE)
-        self.batch_buffer = []
-        self.batch_index = 1
+        # 每个会话一个滑动窗口切分器
+        self.chunkers: Dict[str, SlidingWindowChunker] = {}
+        self._chunk_lock = threading.Lock()
+        self._tokenizer = None
+        # 模型只由调度线程调用：查询走交互通道，优先于后台写入
+        self.scheduler = EmbeddingScheduler()
+        self.model_id = str(config.EMBEDDING_MODEL_PATH)
+        self.query_cache = QueryEmbeddingCache(config.QUERY_CACHE_SIZE)
         self._initialize_embedding_model()
+        self._tokenizer = getattr(getattr(self.embedding_model, "_client", None), "tokenizer", None)
+        self.dimension = self._detect_dimension()
+        self.vector_store = create_vector_store(dimension=self.dimension)
         self._start_worker_thread()
 
     def _initialize_embedding_model(self):
@@ -35,97 +48,175 @@ class EmbeddingManager:
             logger.error(f"嵌入模型加载失败: {e}")
             raise
 
+    def _detect_dimension(self) -> int:
+        """从已加载的模型读取向量维度"""
+        try:
+            client = getattr(self.embedding_model, "_client", None)
+            if client is not None and hasattr(client, "get_sentence_embedding_dimension"):
+                dimension = client.get_sentence_embedding_dimension()
+                if dimension:
+                    return int(dimension)
+            return len(self.embedding_model.embed_query("维度"))
+        except Exception as e:
+            logger.warning(f"无法检测嵌入维度，使用默认值 {config.EMBEDDING_DIMENSION}: {e}")
+            return config.EMBEDDING_DIMENSION
+
+    def embed_query(self, query: str) -> List[float]:
+        """向量化检索问题（交互优先通道，重复问题直接命中 LRU 缓存）"""
+        vector = self.query_cache.get(self.model_id, query)
+        if vector is None:
+            vector = self.scheduler.run(self.embedding_model.embed_query, query, lane=LANE_INTERACTIVE)
+            self.query_cache.put(self.model_id, query, vector)
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """向量化后台文档：切成小片依次提交到写入通道，让查询可以插队"""
+        step = max(1, config.EMBED_INGEST_SLICE)
+        vectors: List[List[float]] = []
+        for i in range(0, len(texts), step):
+            vectors.extend(
+                self.scheduler.run(self.embedding_model.embed_documents, texts[i:i + step], lane=LANE_INGEST)
+            )
+        return vectors
+
+    def get_stats(self) -> dict:
+        """嵌入调度各通道的延迟统计与查询缓存命中率"""
+        return {**self.scheduler.get_stats(), "query_cache": self.query_cache.get_stats()}
+
     def _start_worker_thread(self):
         """启动工作线程"""
         thread = threading.Thread(target=self._embedding_worker, daemon=True)
         thread.start()
 
     def _embedding_worker(self):
-        """嵌入处理工作线程"""
+        """嵌入处理工作线程：最多攒 EMBED_BATCH_MAX 条或等待 EMBED_BATCH_WAIT_MS 后批量处理"""
         while True:
             try:
-                item = self.task_queue.get()
-                if item is None:
+                batch = self._drain_batch()
+                self._flush_due_windows()
+                items = [item for item in batch if item is not None]
+                try:
+                    if items:
+                        self._process_embedding_items(items)
+                finally:
+                    for _ in batch:
+                        self.task_queue.task_done()
+
+                if len(items) < len(batch):
                     break
 
-                self._process_embedding_item(item)
-                self.task_queue.task_done()
-
             except Exception as e:
                 logger.error(f"嵌入处理错误: {e}")
 
-    def _process_embedding_item(self, item):
-        """处理单个嵌入项"""
-        text, payload, session_id, id_val = item
+    def _drain_batch(self) -> list:
+        """取出第一条，再在等待窗口内尽量多取（遇到停止信号 None 立即返回）
+
+        空闲超过一秒返回空列表，让工作线程检查需要按时间输出的窗口。
+        """
+        try:
+            first = self.task_queue.get(timeout=1.0)
+        except queue.Empty:
+            return []
+        batch = [first]
+        if first is None:
+            return batch
+
+        deadline = time.monotonic() + config.EMBED_BATCH_WAIT_MS / 1000.0
+        while len(batch) < config.EMBED_BATCH_MAX:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    item = self.task_queue.get(timeout=remaining)
+                else:
+                    item = self.task_queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+            if item is None:
+                break
+        return batch
+
+    def _process_embedding_items(self, items):
+        """一次向量化多条文本，并批量写入向量库"""
         try:
-            vector = self.embedding_model.embed_documents([text])[0]
-            pid = str(uuid5(NAMESPACE_DNS, f"{session_id}-{id_val}"))
-            self.qdrant_manager.upsert_vector(pid, vector, payload)
+            vectors = self.embed_documents([text for text, _, _, _ in items])
+            points = [
+                (str(uuid5(NAMESPACE_DNS, f"{session_id}-{id_val}")), vector, payload)
+                for (_, payload, session_id, id_val), vector in zip(items, vectors)
+            ]
+            self.vector_store.upsert_vectors(points, wait=config.QDRANT_UPSERT_WAIT)
         except Exception as e:
             logger.error(f"向量化出错: {e}")
 
     def enqueue_for_embedding(self, text: str, payload: dict, session_id: str, id_val: int):
-        """将任务加入队列"""
+        """将片段加入队列，并送入会话的滑动窗口；凑满的窗口作为整体再入队"""
         try:
-            # 添加到批量缓冲
-            self.batch_buffer.append({
-                "id": id_val,
-                "text": text,
-                "payload": payload,
-            })
-
-            # 如果达到批量大小，处理批量数据
-            if len(self.batch_buffer) >= config.BATCH_SIZE:
-                self._process_batch(session_id)
-
-            # 同时处理单个条目
             self.task_queue.put_nowait((text, payload, session_id, id_val))
-
         except queue.Full:
             logger.warning("队列已满，丢弃任务")
         except Exception as e:
             logger.error(f"入队失败: {e}")
 
-    def _process_batch(self, session_id: str):
-        """处理批量数据"""
-        if not self.batch_buffer:
-            return
-
         try:
-            # 合并文本
-            combined_text = "".join(item["text"] for item in self.batch_buffer)
-
-            # 计算时间范围
-            starts_ts = [item["payload"].get("start") for item in self.batch_buffer]
-            ends_ts = [item["payload"].get("end") for item in self.batch_buffer]
-
-            if starts_ts and ends_ts:
-                first_start_ts = int(min(starts_ts))
-                last_end_ts = int(max(ends_ts))
-                batch_dur = round(last_end_ts - first_start_ts, 2)
-            else:
-                first_start_ts = last_end_ts = None
-                batch_dur = 0.0
-
-            # 创建批量payload
-            batch_payload = {
-                "type": "batch_speech",
-                "session_id": session_id,
-                "batch_index": self.batch_index,
-                "count": len(self.batch_buffer),
-                "start": first_start_ts,
-                "end": last_end_ts,
-                "dur": batch_dur,
-                "combined_text": combined_text,
-            }
-
-            # 生成批量ID并入队
-            pid_batch = str(uuid5(NAMESPACE_DNS, f"{session_id}-batch-{self.batch_index}"))
-            self.task_queue.put_nowait((combined_text, batch_payload, session_id, f"batch-{self.batch_index}"))
-
-            # 清空缓冲并增加批次号
-            self.batch_buffer.clear()
-            self.batch_index += 1
-
+            with self._chunk_lock:
+                windows = self._get_chunker(session_id).add(
+                    id_val, text, payload.get("start"), payload.get("end")
+                )
+            self._enqueue_windows(windows)
         except Exception as e:
-            logger.error(f"批量处理失败: {e}")
\ No newline at end of file
+            logger.error(f"窗口切分失败: {e}")
+
+    def _get_chunker(self, session_id: str) -> SlidingWindowChunker:
+        chunker = self.chunkers.get(session_id)
+        if chunker is None:
+            chunker = self.chunkers[session_id] = SlidingWindowChunker(session_id, self.count_tokens)
+        return chunker
+
+    def count_tokens(self, text: str) -> int:
+        """用嵌入模型的分词器统计 token 数，不可用时按字符估算"""
+        if self._tokenizer is not None:
+            try:
+                return len(self._tokenizer.encode(text, add_special_tokens=False))
+            except Exception:
+                pass
+        return estimate_tokens(text)
+
+    def _enqueue_windows(self, windows: List[dict]) -> None:
+        for window in windows:
+            try:
+                self.task_queue.put_nowait(
+                    (window["combined_text"], window, window["session_id"], f"batch-{window['batch_index']}")
+                )
+            except queue.Full:
+                logger.warning("队列已满，丢弃窗口")
+
+    def _flush_due_windows(self, force: bool = False) -> None:
+        """输出停顿超时的窗口（force=True 时输出全部尾部片段）"""
+        with self._chunk_lock:
+            windows = [window for chunker in self.chunkers.values() for window in chunker.flush(force)]
+        self._enqueue_windows(windows)
+
+    def flush_session(self, session_id: str) -> None:
+        """会话结束时输出尾部未满的窗口"""
+        with self._chunk_lock:
+            chunker = self.chunkers.get(session_id)
+            windows = chunker.flush(force=True) if chunker else []
+        self._enqueue_windows(windows)
+
+    def reset_session(self, session_id: str) -> None:
+        """新的录制开始时重置会话窗口，窗口序号从 1 开始"""
+        with self._chunk_lock:
+            self.chunkers.pop(session_id, None)
+
+
+_shared_manager: Optional[EmbeddingManager] = None
+_shared_lock = threading.Lock()
+
+
+def get_embedding_manager() -> EmbeddingManager:
+    """获取进程内共享的嵌入服务（只加载一份模型、只启动一个写入线程）"""
+    global _shared_manager
+    with _shared_lock:
+        if _shared_manager is None:
+            _shared_manager = EmbeddingManager()
+        return _shared_manager
@@ -0,0 +1,138 @@
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+import math
+import re
+import threading
+import unicodedata
+
+from src.utils.file_utils import iter_jsonl_reverse
+
+_TOKEN = re.compile(r"[a-z0-9]+|[㐀-鿿]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """中文按字符二元组切分（单字片段保留单字），英文/数字按整词，忽略标点"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    tokens: List[str] = []
+    for run in _TOKEN.findall(text):
+        if run[0].isascii() or len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+class _SessionPostings:
+    """单个会话的倒排表"""
+
+    def __init__(self):
+        self.docs: List[dict] = []
+        self.doc_lens: List[int] = []
+        self.total_len = 0
+        self.postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self.ids: Dict[object, int] = {}
+
+
+class KeywordIndex:
+    """转录片段的增量 BM25 索引
+
+    片段写入时按会话追加到倒排表，检索只遍历查询词对应的倒排链，无需重扫全部文本。
+    用于补足向量检索对原样引用的专业术语（如热词表中的“坡印廷矢量”“TE波”）召回不足的问题。
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, _SessionPostings] = {}
+
+    def has_session(self, session_id: Optional[str]) -> bool:
+        with self._lock:
+            return session_id in self._sessions
+
+    def add(self, row: dict) -> None:
+        """索引一条已落盘的片段（同一 id 只索引一次）"""
+        text = row.get("text") or ""
+        tokens = tokenize(text)
+        if not tokens:
+            return
+        session_id = row.get("session_id")
+        with self._lock:
+            index = self._sessions.setdefault(session_id, _SessionPostings())
+            key = row.get("id")
+            if key is not None and key in index.ids:
+                return
+            doc = len(index.docs)
+            index.docs.append(dict(row))
+            if key is not None:
+                index.ids[key] = doc
+            index.doc_lens.append(len(tokens))
+            index.total_len += len(tokens)
+            for term, tf in Counter(tokens).items():
+                index.postings[term][doc] = tf
+
+    def load_jsonl(self, session_id: str, jsonl_path: str) -> None:
+        """会话未在本进程录制时，从 JSONL 一次性建立索引"""
+        rows = [row for row in iter_jsonl_reverse(jsonl_path) if row.get("session_id", session_id) == session_id]
+        with self._lock:
+            self._sessions.setdefault(session_id, _SessionPostings())
+        for row in reversed(rows):
+            self.add({**row, "session_id": session_id})
+
+    def reset_session(self, session_id: Optional[str]) -> None:
+        with self._lock:
+            self._sessions[session_id] = _SessionPostings()
+
+    def search(self, query: str, limit: int = 5, session_id: Optional[str] = None) -> List[Tuple[float, dict]]:
+        """返回 (BM25 得分, 片段) 列表，按得分降序"""
+        terms = set(tokenize(query))
+        if not terms or limit <= 0:
+            return []
+        with self._lock:
+            if session_id is not None:
+                indexes = [self._sessions[session_id]] if session_id in self._sessions else []
+            else:
+                indexes = list(self._sessions.values())
+            hits: List[Tuple[float, dict]] = []
+            for index in indexes:
+                hits.extend(self._score(index, terms))
+        hits.sort(key=lambda item: item[0], reverse=True)
+        return [(score, dict(doc)) for score, doc in hits[:limit]]
+
+    def _score(self, index: _SessionPostings, terms) -> List[Tuple[float, dict]]:
+        n_docs = len(index.docs)
+        if not n_docs:
+            return []
+        avg_len = index.total_len / n_docs
+        scores: Dict[int, float] = defaultdict(float)
+        for term in terms:
+            posting = index.postings.get(term)
+            if not posting:
+                continue
+            df = len(posting)
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for doc, tf in posting.items():
+                norm = self.k1 * (1 - self.b + self.b * index.doc_lens[doc] / avg_len)
+                scores[doc] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return [(score, index.docs[doc]) for doc, score in scores.items()]
+
+
+def reciprocal_rank_fusion(result_lists: List[List[dict]], limit: int, k: int = 60) -> List[dict]:
+    """按 RRF 融合多路检索结果：片段以 (type, id/batch_index) 去重"""
+    scores: Dict[tuple, float] = defaultdict(float)
+    payloads: Dict[tuple, dict] = {}
+    for results in result_lists:
+        for rank, payload in enumerate(results):
+            key = (
+                payload.get("session_id"),
+                payload.get("type", "speech"),
+                payload.get("batch_index", payload.get("id")),
+            )
+            scores[key] += 1.0 / (k + rank + 1)
+            payloads.setdefault(key, payload)
+    ranked = sorted(scores, key=scores.get, reverse=True)
+    return [payloads[key] for key in ranked[:limit]]
+
+
+# 全局关键词索引实例
+keyword_index = KeywordIndex()
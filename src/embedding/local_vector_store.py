@@ -0,0 +1,224 @@
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import hashlib
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+from config.settings import config
+from src.embedding.vector_store import VectorStore
+from src.utils.file_utils import ensure_directory
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_SESSION = "__default__"
+
+
+class _SessionIndex:
+    """单个会话的向量矩阵
+
+    向量按行存放在内存映射的 float32 文件中（已归一化，点积即余弦），容量不足时翻倍扩容；
+    payload 追加写入 points.jsonl，启动时按 id 重放（同一 id 以最后一次为准）。
+    每批写入后先 flush 向量与 payload，再把已提交的行数和 points.jsonl 长度写入 meta.json；
+    启动时只加载已提交的部分，写到一半就退出的那一批会被丢弃。
+    """
+
+    def __init__(self, directory: Path, session_id: str, dimension: int):
+        self.directory = directory
+        self.session_id = session_id
+        self.dimension = dimension
+        self.vectors_path = directory / "vectors.f32"
+        self.points_path = directory / "points.jsonl"
+        self.meta_path = directory / "meta.json"
+        self.rows: Dict[str, int] = {}
+        self.payloads: List[Optional[dict]] = []
+        self.matrix: Optional[np.memmap] = None
+        self.capacity = 0
+        ensure_directory(str(directory))
+        self._load()
+        self._points = open(self.points_path, "ab")
+        self._write_meta()
+
+    @property
+    def count(self) -> int:
+        return len(self.payloads)
+
+    def _read_meta(self) -> dict:
+        try:
+            return json.loads(self.meta_path.read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def _write_meta(self) -> None:
+        meta = {
+            "session_id": self.session_id,
+            "dimension": self.dimension,
+            "rows": self.count,
+            "points_bytes": self._points.tell(),
+        }
+        tmp_path = self.meta_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, self.meta_path)
+
+    def _load(self) -> None:
+        meta = self._read_meta()
+        committed_rows = int(meta.get("rows", 0))
+        committed_bytes = int(meta.get("points_bytes", 0))
+        if self.points_path.exists():
+            with open(self.points_path, "rb") as f:
+                data = f.read(committed_bytes)
+            for line in data.decode("utf-8", errors="ignore").splitlines():
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                row = int(record["row"])
+                if row >= committed_rows:
+                    continue
+                self.rows[record["id"]] = row
+                if row >= len(self.payloads):
+                    self.payloads.extend([None] * (row + 1 - len(self.payloads)))
+                self.payloads[row] = record.get("payload")
+            if self.points_path.stat().st_size > committed_bytes:
+                logger.warning(f"丢弃会话 {self.session_id} 中向量未落盘的本地索引记录")
+                with open(self.points_path, "ab") as f:
+                    f.truncate(committed_bytes)
+
+        existing = self.vectors_path.stat().st_size // (4 * self.dimension) if self.vectors_path.exists() else 0
+        self._resize(max(existing, self.count, 64))
+
+    def _resize(self, capacity: int) -> None:
+        if self.matrix is not None:
+            self.matrix.flush()
+            del self.matrix
+        with open(self.vectors_path, "ab") as f:
+            f.truncate(capacity * self.dimension * 4)
+        self.matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dimension))
+        self.capacity = capacity
+
+    def upsert(self, point_id: str, vector: np.ndarray, payload: dict) -> None:
+        row = self.rows.get(point_id)
+        if row is None:
+            row = self.count
+            if row >= self.capacity:
+                self._resize(self.capacity * 2)
+            self.rows[point_id] = row
+            self.payloads.append(payload)
+        else:
+            self.payloads[row] = payload
+        self.matrix[row] = vector
+        record = json.dumps({"id": point_id, "row": row, "payload": payload}, ensure_ascii=False)
+        self._points.write((record + "\n").encode("utf-8"))
+
+    def flush(self) -> None:
+        """向量与 payload 落盘后提交当前行数"""
+        self._points.flush()
+        self.matrix.flush()
+        self._write_meta()
+
+    def search(self, query: np.ndarray, limit: int) -> List[Tuple[float, dict]]:
+        count = self.count
+        if not count or limit <= 0:
+            return []
+        scores = self.matrix[:count] @ query
+        k = min(limit, count)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[i]), self.payloads[i]) for i in top if self.payloads[i] is not None]
+
+    def close(self) -> None:
+        self.flush()
+        self._points.close()
+
+
+class LocalVectorStore(VectorStore):
+    """进程内向量索引（无需 Qdrant 服务）
+
+    每个集合一个目录，集合内每个会话一个子目录；暴力 NumPy 余弦检索，
+    对单机一门课数千条片段的规模检索耗时在毫秒以内。
+    """
+
+    def __init__(self, dimension: Optional[int] = None, root: Optional[str] = None):
+        self.dimension = dimension or config.EMBEDDING_DIMENSION
+        self.root = Path(root or config.LOCAL_VECTOR_DIR)
+        self._lock = threading.RLock()
+        self._indexes: Dict[Tuple[str, str], _SessionIndex] = {}
+        ensure_directory(str(self.root))
+
+    def _session_dir(self, collection: str, session_id: str) -> Path:
+        digest = hashlib.sha1(session_id.encode("utf-8")).hexdigest()[:16]
+        return self.root / collection / digest
+
+    def _get_index(self, collection: str, session_id: str) -> _SessionIndex:
+        key = (collection, session_id)
+        index = self._indexes.get(key)
+        if index is None:
+            directory = self._session_dir(collection, session_id)
+            index = self._indexes[key] = _SessionIndex(directory, session_id, self.dimension)
+        return index
+
+    def _load_collection(self, collection: str) -> List[_SessionIndex]:
+        """加载集合目录下所有会话（用于不带 session_id 的检索）"""
+        collection_dir = self.root / collection
+        if collection_dir.exists():
+            for meta_path in collection_dir.glob("*/meta.json"):
+                try:
+                    meta = json.loads(meta_path.read_text(encoding="utf-8"))
+                except (OSError, json.JSONDecodeError):
+                    continue
+                if meta.get("dimension") == self.dimension:
+                    self._get_index(collection, meta["session_id"])
+        return [index for (name, _), index in self._indexes.items() if name == collection]
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(array))
+        return array / norm if norm > 0 else array
+
+    def upsert_vectors(self, points: List[Tuple[str, list, dict]], wait: bool = True):
+        """批量写入并提交
+
+        wait 是 Qdrant 的确认选项，此处忽略：本地索引每批都提交，否则在不调用 close
+        就退出的进程里（录音与嵌入线程均为守护线程）已写入的向量在重启后会全部丢弃。
+        """
+        if not points:
+            return
+        try:
+            with self._lock:
+                touched = {}
+                for point_id, vector, payload in points:
+                    session_id = str(payload.get("session_id") or _DEFAULT_SESSION)
+                    index = self._get_index(config.QDRANT_COLLECTION, session_id)
+                    index.upsert(str(point_id), self._normalize(vector), payload)
+                    touched[id(index)] = index
+                for index in touched.values():
+                    index.flush()
+            logger.debug(f"本地向量批量写入成功: {len(points)} 条")
+        except Exception as e:
+            logger.error(f"本地向量写入失败: {e}")
+
+    def search(self, query_vector: list, limit: int = 5, session_id: Optional[str] = None,
+               collection_name: Optional[str] = None) -> List[dict]:
+        collection = collection_name or config.QDRANT_COLLECTION
+        query = self._normalize(query_vector)
+        with self._lock:
+            if session_id:
+                directory = self._session_dir(collection, session_id)
+                if (collection, session_id) not in self._indexes and not directory.exists():
+                    return []
+                indexes = [self._get_index(collection, session_id)]
+            else:
+                indexes = self._load_collection(collection)
+            hits = [hit for index in indexes for hit in index.search(query, limit)]
+        hits.sort(key=lambda item: item[0], reverse=True)
+        return [payload for _, payload in hits[:limit]]
+
+    def close(self) -> None:
+        with self._lock:
+            for index in self._indexes.values():
+                index.close()
+            self._indexes.clear()
@@ -1,70 +1,181 @@
 from qdrant_client import QdrantClient
 from qdrant_client.http import models as qm
 from qdrant_client.http.models import PointStruct
+from qdrant_client.models import Filter, FieldCondition, MatchValue
 from config.settings import config
+from src.embedding.vector_store import VectorStore
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
 import logging
+import queue
+import threading
 
 logger = logging.getLogger(__name__)
 
 
-class QdrantManager:
-    """Qdrant向量数据库管理"""
+class QdrantManager(VectorStore):
+    """Qdrant向量数据库管理（线程安全的客户端池，供写入与检索复用连接）"""
 
-    def __init__(self):
+    def __init__(self, dimension: Optional[int] = None, pool_size: Optional[int] = None):
+        # 向量维度由已加载的嵌入模型检测得到；未提供时回退到 bge-small-zh-v1.5 的 512
+        self.dimension = dimension or config.EMBEDDING_DIMENSION
+        self.pool_size = max(1, pool_size or config.QDRANT_POOL_SIZE)
         self.client = None
+        self._pool: queue.LifoQueue = queue.LifoQueue()
+        self._pool_lock = threading.Lock()
+        self._created = 0
         self._initialize_client()
         self._ensure_collection()
 
+    def _new_client(self) -> QdrantClient:
+        return QdrantClient(
+            host=config.QDRANT_HOST,
+            port=config.QDRANT_PORT,
+            grpc_port=config.QDRANT_GRPC_PORT,
+            prefer_grpc=config.QDRANT_PREFER_GRPC,
+            timeout=config.QDRANT_TIMEOUT,
+        )
+
     def _initialize_client(self):
         """初始化Qdrant客户端"""
         try:
-            self.client = QdrantClient(
-                host=config.QDRANT_HOST,
-                port=config.QDRANT_PORT
-            )
+            self.client = self._new_client()
+            self._created = 1
+            self._pool.put(self.client)
             logger.info("Qdrant客户端连接成功")
         except Exception as e:
             logger.error(f"Qdrant客户端连接失败: {e}")
             raise
 
+    @contextmanager
+    def acquire_client(self) -> Iterator[QdrantClient]:
+        """从连接池借出一个客户端，用完自动归还；池内不足时按需创建，达到上限后等待"""
+        try:
+            client = self._pool.get_nowait()
+        except queue.Empty:
+            client = None
+            with self._pool_lock:
+                if self._created < self.pool_size:
+                    self._created += 1
+                    try:
+                        client = self._new_client()
+                    except Exception:
+                        self._created -= 1
+                        raise
+            if client is None:
+                client = self._pool.get(timeout=config.QDRANT_TIMEOUT)
+        try:
+            yield client
+        finally:
+            self._pool.put(client)
+
     def _ensure_collection(self):
-        """确保集合存在"""
+        """确保集合存在，并建立 session_id / type / start / end 的 payload 索引"""
         try:
-            # 直接使用固定维度（bge-small-zh-v1.5的维度是512）
-            DIMENSION = 512
+            with self.acquire_client() as client:
+                # 检查或创建集合
+                try:
+                    info = client.get_collection(config.QDRANT_COLLECTION)
+                    logger.info(f"集合已存在: {config.QDRANT_COLLECTION}")
+                    self._check_dimension(info)
+                except Exception:
+                    client.create_collection(
+                        collection_name=config.QDRANT_COLLECTION,
+                        vectors_config={
+                            "text": qm.VectorParams(
+                                size=self.dimension,
+                                distance=qm.Distance.COSINE
+                            )
+                        }
+                    )
+                    logger.info(f"创建集合: {config.QDRANT_COLLECTION}（维度 {self.dimension}）")
+                    info = client.get_collection(config.QDRANT_COLLECTION)
 
-            # 检查或创建集合
-            try:
-                self.client.get_collection(config.QDRANT_COLLECTION)
-                logger.info(f"集合已存在: {config.QDRANT_COLLECTION}")
-            except Exception:
-                self.client.create_collection(
-                    collection_name=config.QDRANT_COLLECTION,
-                    vectors_config={
-                        "text": qm.VectorParams(
-                            size=DIMENSION,
-                            distance=qm.Distance.COSINE
-                        )
-                    }
-                )
-                logger.info(f"创建集合: {config.QDRANT_COLLECTION}")
+                self._ensure_payload_indexes(client, info)
 
         except Exception as e:
             logger.error(f"集合初始化失败: {e}")
             # 如果失败，继续运行，可能在后续操作中会重新尝试
 
-    def upsert_vector(self, point_id: str, vector: list, payload: dict):
-        """插入或更新向量"""
+    def _check_dimension(self, info) -> None:
+        """已有集合的向量维度与当前模型不一致时给出警告"""
+        vectors = info.config.params.vectors
+        params = vectors.get("text") if isinstance(vectors, dict) else vectors
+        size = getattr(params, "size", None)
+        if size is not None and size != self.dimension:
+            logger.warning(
+                f"集合 {config.QDRANT_COLLECTION} 的向量维度为 {size}，与当前模型维度 {self.dimension} 不一致"
+            )
+
+    @staticmethod
+    def _payload_index_schemas() -> dict:
+        """会话过滤检索用到的 payload 索引：session_id 作为租户键"""
+        integer_range = qm.IntegerIndexParams(type=qm.IntegerIndexType.INTEGER, lookup=False, range=True)
+        return {
+            "session_id": qm.KeywordIndexParams(type=qm.KeywordIndexType.KEYWORD, is_tenant=True),
+            "type": qm.KeywordIndexParams(type=qm.KeywordIndexType.KEYWORD),
+            "start": integer_range,
+            "end": integer_range,
+        }
+
+    def _ensure_payload_indexes(self, client: QdrantClient, info) -> None:
+        existing = set((getattr(info, "payload_schema", None) or {}).keys())
+        for field_name, schema in self._payload_index_schemas().items():
+            if field_name in existing:
+                continue
+            try:
+                client.create_payload_index(
+                    collection_name=config.QDRANT_COLLECTION,
+                    field_name=field_name,
+                    field_schema=schema,
+                )
+                logger.info(f"创建 payload 索引: {field_name}")
+            except Exception as e:
+                logger.warning(f"创建 payload 索引失败 {field_name}: {e}")
+
+    def upsert_vectors(self, points: List[Tuple[str, list, dict]], wait: bool = True):
+        """批量插入或更新向量：points 为 (point_id, vector, payload) 列表，一次请求写入"""
+        if not points:
+            return
         try:
-            point = PointStruct(
-                id=point_id,
-                vector={"text": vector},
-                payload=payload
+            structs = [
+                PointStruct(
+                    id=point_id,
+                    vector={"text": vector},
+                    payload=payload
+                )
+                for point_id, vector, payload in points
+            ]
+            with self.acquire_client() as client:
+                client.upsert(
+                    collection_name=config.QDRANT_COLLECTION,
+                    points=structs,
+                    wait=wait,
+                )
+            logger.debug(f"向量批量插入成功: {len(structs)} 条")
+        except Exception as e:
+            logger.error(f"向量插入失败: {e}")
+
+    def search(self, query_vector: list, limit: int = 5, session_id: Optional[str] = None,
+               collection_name: Optional[str] = None) -> List[dict]:
+        """向量检索，返回命中点的 payload 列表（可按 session_id 过滤）"""
+        query_filter = None
+        if session_id:
+            query_filter = Filter(
+                must=[
+                    FieldCondition(
+                        key="session_id", match=MatchValue(value=f"{session_id}")
+                    )
+                ]
             )
-            self.client.upsert(
-                collection_name=config.QDRANT_COLLECTION,
-                points=[point]
+        with self.acquire_client() as client:
+            results = client.query_points(
+                collection_name=collection_name or config.QDRANT_COLLECTION,
+                query=query_vector,
+                using="text",
+                limit=limit,
+                with_payload=True,
+                with_vectors=False,
+                query_filter=query_filter,
             )
-            logger.debug(f"向量插入成功: {point_id}")
-        except Exception as e:
-            logger.error(f"向量插入失败: {e}")
\ No newline at end of file
+        return [point.payload for point in results.points]
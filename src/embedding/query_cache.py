@@ -0,0 +1,60 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import re
+import threading
+import unicodedata
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(text: str) -> str:
+    """规范化查询文本：全半角统一（NFKC）、去首尾空白、合并连续空白、英文小写"""
+    text = unicodedata.normalize("NFKC", text or "")
+    return _WHITESPACE.sub(" ", text).strip().lower()
+
+
+class QueryEmbeddingCache:
+    """查询向量的有界 LRU 缓存，键为 (模型标识, 规范化查询文本)"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = max(0, maxsize)
+        self._data: "OrderedDict[Tuple[str, str], List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, model_id: str, query: str) -> Optional[List[float]]:
+        key = (model_id, normalize_query(query))
+        with self._lock:
+            vector = self._data.get(key)
+            if vector is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return list(vector)
+
+    def put(self, model_id: str, query: str, vector: List[float]) -> None:
+        if self.maxsize == 0:
+            return
+        key = (model_id, normalize_query(query))
+        with self._lock:
+            self._data[key] = list(vector)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def get_stats(self) -> Dict[str, float]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
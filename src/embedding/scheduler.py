@@ -0,0 +1,104 @@
+from concurrent.futures import Future
+from collections import deque
+from typing import Callable, Dict
+import itertools
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 优先级通道：数值越小越先执行
+LANE_INTERACTIVE = 0  # 用户提问的查询向量
+LANE_INGEST = 1       # 后台片段/批量文本写入
+
+LANE_NAMES = {LANE_INTERACTIVE: "interactive", LANE_INGEST: "ingest"}
+_STOP_LANE = 99
+
+
+class _LaneStats:
+    """单个通道的排队/执行耗时统计"""
+
+    def __init__(self, window: int = 256):
+        self.count = 0
+        self.total_wait = 0.0
+        self.total_run = 0.0
+        self.max_wait = 0.0
+        self.recent_waits = deque(maxlen=window)
+
+    def record(self, wait: float, run: float) -> None:
+        self.count += 1
+        self.total_wait += wait
+        self.total_run += run
+        self.max_wait = max(self.max_wait, wait)
+        self.recent_waits.append(wait)
+
+    def snapshot(self) -> Dict[str, float]:
+        waits = sorted(self.recent_waits)
+        p95 = waits[min(len(waits) - 1, int(len(waits) * 0.95))] if waits else 0.0
+        return {
+            "count": self.count,
+            "avg_wait_ms": round(1000 * self.total_wait / self.count, 2) if self.count else 0.0,
+            "p95_wait_ms": round(1000 * p95, 2),
+            "max_wait_ms": round(1000 * self.max_wait, 2),
+            "avg_run_ms": round(1000 * self.total_run / self.count, 2) if self.count else 0.0,
+        }
+
+
+class EmbeddingScheduler:
+    """嵌入模型调度器
+
+    由单个线程独占调用模型，任务按 (通道, 提交顺序) 出队：交互查询会越过所有排队中的
+    后台文档批次，最多只需等待正在执行的那一批完成。调用方应把大批量文档切成小片
+    分次提交，以控制查询的最坏等待时间。
+    """
+
+    def __init__(self, name: str = "EmbeddingScheduler"):
+        self._queue: queue.PriorityQueue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._stats_lock = threading.Lock()
+        self._stats = {lane: _LaneStats() for lane in LANE_NAMES}
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, fn: Callable, *args, lane: int = LANE_INGEST) -> Future:
+        """提交任务，返回 Future"""
+        future: Future = Future()
+        self._queue.put((lane, next(self._seq), time.monotonic(), fn, args, future))
+        return future
+
+    def run(self, fn: Callable, *args, lane: int = LANE_INGEST):
+        """提交任务并等待结果"""
+        return self.submit(fn, *args, lane=lane).result()
+
+    def _run(self):
+        while True:
+            lane, _, enqueued_at, fn, args, future = self._queue.get()
+            if fn is None:
+                break
+            if not future.set_running_or_notify_cancel():
+                continue
+
+            started_at = time.monotonic()
+            try:
+                result = fn(*args)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+            finally:
+                with self._stats_lock:
+                    self._stats[lane].record(started_at - enqueued_at, time.monotonic() - started_at)
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """各通道的排队等待与执行耗时统计"""
+        with self._stats_lock:
+            return {
+                LANE_NAMES[lane]: stats.snapshot() for lane, stats in self._stats.items()
+            }
+
+    def shutdown(self) -> None:
+        """处理完已排队任务后停止调度线程"""
+        self._queue.put((_STOP_LANE, next(self._seq), time.monotonic(), None, (), None))
+        self._thread.join()
@@ -0,0 +1,38 @@
+from abc import ABC, abstractmethod
+from typing import List, Optional, Tuple
+import logging
+
+from config.settings import config
+
+logger = logging.getLogger(__name__)
+
+
+class VectorStore(ABC):
+    """向量存储接口：写入 (point_id, vector, payload)，按余弦相似度检索 payload"""
+
+    def upsert_vector(self, point_id: str, vector: list, payload: dict):
+        """插入或更新向量"""
+        self.upsert_vectors([(point_id, vector, payload)])
+
+    @abstractmethod
+    def upsert_vectors(self, points: List[Tuple[str, list, dict]], wait: bool = True):
+        """批量插入或更新向量"""
+
+    @abstractmethod
+    def search(self, query_vector: list, limit: int = 5, session_id: Optional[str] = None,
+               collection_name: Optional[str] = None) -> List[dict]:
+        """向量检索，返回命中点的 payload 列表（可按 session_id 过滤）"""
+
+
+def create_vector_store(dimension: Optional[int] = None) -> VectorStore:
+    """按 config.VECTOR_STORE 创建向量存储：qdrant（外部服务）或 local（进程内 NumPy 索引）"""
+    backend = (config.VECTOR_STORE or "qdrant").lower()
+    if backend == "local":
+        from src.embedding.local_vector_store import LocalVectorStore
+        logger.info("使用本地向量索引")
+        return LocalVectorStore(dimension=dimension)
+    if backend != "qdrant":
+        raise ValueError(f"未知的向量存储类型: {config.VECTOR_STORE}")
+
+    from src.embedding.qdrant_client import QdrantManager
+    return QdrantManager(dimension=dimension)
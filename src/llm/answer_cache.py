@@ -0,0 +1,127 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+import hashlib
+import threading
+import time
+
+
+def normalize_question(text: str) -> str:
+    return " ".join((text or "").split())
+
+
+def _similarity(a: Sequence[float], b: Sequence[float]) -> float:
+    return sum(x * y for x, y in zip(a, b))
+
+
+def history_fingerprint(
+        history: Sequence,
+        question: str,
+        vector: Optional[Sequence[float]] = None,
+        turn_vectors: Optional[Dict[str, Sequence[float]]] = None,
+        threshold: float = 1.0,
+        window: int = 8,
+) -> str:
+    """对进入提示词的历史消息取摘要，作为回答缓存作用域的一部分
+
+    回答写入缓存时，本轮问答尚未加入历史；之后再问同一问题（或相近的问题），历史末尾
+    正是这轮（或重复命中后多轮）问答。先去掉末尾与当前问题相同的问答对再取摘要，使重复
+    提问与写入时落在同一作用域。“相同”指文本一致，或 turn_vectors 中记录的该问题向量
+    与 vector 的相似度不低于 threshold。消息只需带有 type 与 content 属性。
+    """
+    messages = list(history)
+    target = normalize_question(question)
+    turn_vectors = turn_vectors or {}
+
+    def is_repeat(text: str) -> bool:
+        text = normalize_question(text)
+        if text == target:
+            return True
+        known = turn_vectors.get(text)
+        return vector is not None and known is not None and _similarity(vector, known) >= threshold
+
+    while (
+            len(messages) >= 2
+            and messages[-2].type == "human"
+            and messages[-1].type == "ai"
+            and is_repeat(messages[-2].content)
+    ):
+        del messages[-2:]
+    digest = hashlib.sha1()
+    for message in messages[-window:]:
+        digest.update(f"{message.type}:{message.content}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+@dataclass
+class _CachedAnswer:
+    vector: List[float]
+    answer: str
+    created_at: float
+
+
+class SemanticAnswerCache:
+    """语义回答缓存
+
+    条目按作用域 (会话, 转录版本, 历史指纹) 分组，作用域内按问题向量的余弦相似度匹配
+    （向量已归一化，点积即余弦）。转录有新片段或对话历史变化时作用域随之变化，旧条目
+    不会再被命中，最终由 TTL 或容量上限（LRU）淘汰。
+    """
+
+    def __init__(self, maxsize: int, ttl: float, threshold: float):
+        self.maxsize = max(0, maxsize)
+        self.ttl = ttl
+        self.threshold = threshold
+        self._entries: "OrderedDict[Tuple[Hashable, int], _CachedAnswer]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._seq = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _expired(self, entry: _CachedAnswer, now: float) -> bool:
+        return self.ttl > 0 and now - entry.created_at > self.ttl
+
+    def lookup(self, scope: Hashable, vector: List[float]) -> Optional[str]:
+        """返回作用域内相似度不低于阈值的最相近回答"""
+        now = time.monotonic()
+        with self._lock:
+            best_key, best_score = None, self.threshold
+            for key, entry in list(self._entries.items()):
+                if self._expired(entry, now):
+                    del self._entries[key]
+                    continue
+                if key[0] != scope:
+                    continue
+                score = _similarity(vector, entry.vector)
+                if score >= best_score:
+                    best_key, best_score = key, score
+            if best_key is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_key)
+            self.hits += 1
+            return self._entries[best_key].answer
+
+    def store(self, scope: Hashable, vector: List[float], answer: str) -> None:
+        if self.maxsize == 0 or not answer:
+            return
+        with self._lock:
+            self._seq += 1
+            self._entries[(scope, self._seq)] = _CachedAnswer(list(vector), answer, time.monotonic())
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, float]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
@@ -1,21 +1,24 @@
 from __future__ import annotations
 
-import json
+import asyncio
 import logging
 import re
 from datetime import datetime
-from typing import Dict, Iterator, List, Optional, Tuple
+from pathlib import Path
+from typing import AsyncIterator, Dict, Iterator, List, Optional, Tuple
 
 from config.prompts import PROMPT_TEMPLATES
 from config.settings import config
 from langchain.memory import ConversationBufferMemory
 from langchain.prompts import ChatPromptTemplate
 from langchain.schema import AIMessage, BaseMessage, HumanMessage
-from qdrant_client import QdrantClient
-from qdrant_client.models import Filter, FieldCondition, MatchValue, QueryResponse
 
-from src.embedding.embedding_manager import EmbeddingManager
+from src.embedding.embedding_manager import EmbeddingManager, get_embedding_manager
+from src.embedding.keyword_index import keyword_index, reciprocal_rank_fusion
+from src.llm.answer_cache import SemanticAnswerCache, history_fingerprint, normalize_question
 from src.llm.model_manager import ModelManager
+from src.utils.file_utils import iter_jsonl_reverse
+from src.utils.transcript_store import transcript_store
 
 logger = logging.getLogger(__name__)
 
@@ -23,13 +26,19 @@ logger = logging.getLogger(__name__)
 class RAGProcessor:
     """RAG处理器"""
 
-    def __init__(self):
+    def __init__(self, embedding_manager: Optional[EmbeddingManager] = None):
         self.model_manager = ModelManager()
-        self.embedding_manager = EmbeddingManager()
+        # 与录音端共用同一个嵌入服务，避免重复加载模型
+        self.embedding_manager = embedding_manager or get_embedding_manager()
         self.prompt_template = ChatPromptTemplate.from_messages(
             PROMPT_TEMPLATES["DEEPSEEK_CHAT"]
         )
         self.memories: Dict[str, ConversationBufferMemory] = {}
+        # 每个会话最近几轮提问的向量，用于判断历史末尾是否是与当前问题相近的重复提问
+        self.turn_vectors: Dict[str, Dict[str, List[float]]] = {}
+        self.answer_cache = SemanticAnswerCache(
+            config.ANSWER_CACHE_SIZE, config.ANSWER_CACHE_TTL_S, config.ANSWER_CACHE_THRESHOLD
+        )
 
         # ------------------------------------------------------------------
         # Conversation helpers
@@ -49,22 +58,38 @@ class RAGProcessor:
 
         key = self._memory_key(session_id)
         self.memories[key] = ConversationBufferMemory(return_messages=True)
+        self.turn_vectors.pop(key, None)
 
     def _prepare_prompt(
-            self, question: str, jsonl_path: Optional[str], session_id: Optional[str]
+            self, question: str, jsonl_path: Optional[str], session_id: Optional[str],
+            query_vector: Optional[List[float]] = None,
     ) -> Tuple[List[BaseMessage], ConversationBufferMemory]:
-        context_results = self.search_context(question, limit=5, session_id=session_id)
+        context_text = self._context_text(question, jsonl_path, session_id, query_vector)
+        realtime_text = self._realtime_text(jsonl_path, session_id)
+        return self._build_messages(question, session_id, context_text, realtime_text)
+
+    def _context_text(
+            self, question: str, jsonl_path: Optional[str], session_id: Optional[str],
+            query_vector: Optional[List[float]] = None,
+    ) -> str:
+        """检索上下文（向量/关键词检索；未传入问题向量时先向量化）"""
+        context_results = self.search_context(
+            question, limit=5, session_id=session_id, jsonl_path=jsonl_path, query_vector=query_vector
+        )
         context_text = "\n".join(
-            filter(None, [result.get("combined_text") for result in context_results])
+            filter(None, [result.get("combined_text") or result.get("text") for result in context_results])
         )
         logger.info("json源文本:%s", context_text)
-        logger.info("jsonclear:%s", context_text)
+        return context_text
 
-        realtime_text = (
-            self.jsonl_to_markdown(jsonl_path) if jsonl_path else "无实时文本"
-        )
+    def _realtime_text(self, jsonl_path: Optional[str], session_id: Optional[str]) -> str:
+        realtime_text = self._realtime_markdown(jsonl_path, session_id)
         logger.info("实时文本%s", realtime_text)
+        return realtime_text
 
+    def _build_messages(
+            self, question: str, session_id: Optional[str], context_text: str, realtime_text: str
+    ) -> Tuple[List[BaseMessage], ConversationBufferMemory]:
         memory = self._get_memory(session_id)
         history_messages: List[BaseMessage] = memory.load_memory_variables({}).get(
             "history", []
@@ -81,6 +106,66 @@ class RAGProcessor:
 
         return messages, memory
 
+    # ------------------------------------------------------------------
+    # Answer cache helpers
+    # ------------------------------------------------------------------
+
+    def _transcript_version(self, jsonl_path: Optional[str], session_id: Optional[str]) -> tuple:
+        """转录版本：本进程录制的会话取 TranscriptStore 的单调版本号（重新开始的课程不会与
+        之前的录制重复）；否则取 (文件路径, 最后一行 id)"""
+        if session_id and transcript_store.has_session(session_id):
+            return "store", transcript_store.get_session_version(session_id)
+        if not jsonl_path:
+            return "none", 0
+        try:
+            last_row = next(iter_jsonl_reverse(jsonl_path), None)
+        except OSError:
+            return "none", 0
+        return str(Path(jsonl_path).resolve()), int(last_row.get("id", 0)) if last_row else 0
+
+    def _history_fingerprint(
+            self, session_id: Optional[str], question: str, vector: Optional[List[float]]
+    ) -> str:
+        """历史摘要（不含末尾与当前问题相同或相近的问答），历史变化时缓存作用域随之变化"""
+        history = self._get_memory(session_id).load_memory_variables({}).get("history", [])
+        return history_fingerprint(
+            history,
+            question,
+            vector=vector,
+            turn_vectors=self.turn_vectors.get(self._memory_key(session_id)),
+            threshold=self.answer_cache.threshold,
+        )
+
+    def _embed_question(self, question: str) -> Optional[List[float]]:
+        """问题向量化一次，供回答缓存与向量检索共用；失败时返回 None"""
+        try:
+            return self.embedding_manager.embed_query(question)
+        except Exception as e:
+            logger.warning(f"问题向量化失败: {e}")
+            return None
+
+    def _lookup_answer(
+            self, question: str, jsonl_path: Optional[str], session_id: Optional[str],
+            vector: Optional[List[float]],
+    ) -> Tuple[Optional[str], Optional[tuple]]:
+        """查询回答缓存，返回 (缓存回答, 作用域)；缓存不可用时均为 None"""
+        if not self.answer_cache.maxsize or vector is None:
+            return None, None
+        try:
+            scope = (
+                self._memory_key(session_id),
+                self._transcript_version(jsonl_path, session_id),
+                self._history_fingerprint(session_id, question, vector),
+            )
+        except Exception as e:
+            logger.warning(f"回答缓存查询失败: {e}")
+            return None, None
+        return self.answer_cache.lookup(scope, vector), scope
+
+    def _store_answer(self, scope: Optional[tuple], vector: Optional[List[float]], answer: str) -> None:
+        if scope is not None and vector is not None:
+            self.answer_cache.store(scope, vector, answer)
+
     def get_conversation_history(
             self, session_id: Optional[str], limit: int = 20
     ) -> List[Dict[str, str]]:
@@ -104,47 +189,42 @@ class RAGProcessor:
             pairs.append(current)
         return pairs[-limit:]
 
-    def _read_jsonl(self, path):
-        rows = []
-        with open(path, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                try:
-                    rows.append(json.loads(line))
-                except Exception:
-                    pass
-        return rows
-
     def search_context(
-            self, query: str, limit: int = 5, session_id: Optional[str] = None
+            self,
+            query: str,
+            limit: int = 5,
+            session_id: Optional[str] = None,
+            jsonl_path: Optional[str] = None,
+            query_vector: Optional[List[float]] = None,
     ) -> List[dict]:
-        """搜索相关上下文"""
+        """搜索相关上下文：向量检索，开启混合检索时再与 BM25 关键词结果按 RRF 融合"""
+        candidates = limit * 2 if config.HYBRID_RETRIEVAL else limit
         try:
-            query_vector = self.embedding_manager.embedding_model.embed_query(query)
-            query_filter = None
-            if session_id:
-                query_filter = Filter(
-                    must=[
-                        FieldCondition(
-                            key="session_id", match=MatchValue(value=f"{session_id}")
-                        )
-                    ]
-                )
-            client = QdrantClient(host=config.QDRANT_HOST, port=config.QDRANT_PORT)
-            results: QueryResponse = client.query_points(
-                collection_name=config.QDRANT_COLLECTION,
-                query=query_vector,
-                using="text",
-                limit=limit,
-                with_payload=True,
-                query_filter=query_filter,
+            if query_vector is None:
+                query_vector = self.embedding_manager.embed_query(query)
+            # 复用共享的向量存储（Qdrant 连接池或本地索引）
+            vector_results = self.embedding_manager.vector_store.search(
+                query_vector, limit=candidates, session_id=session_id
             )
-
-            return [point.payload for point in results.points]
         except Exception as e:
             logger.error(f"上下文搜索失败: {e}")
+            vector_results = []
+
+        if not config.HYBRID_RETRIEVAL:
+            return vector_results
+        keyword_results = [doc for _, doc in self._keyword_search(query, candidates, session_id, jsonl_path)]
+        return reciprocal_rank_fusion([vector_results, keyword_results], limit=limit, k=config.RRF_K)
+
+    def _keyword_search(
+            self, query: str, limit: int, session_id: Optional[str], jsonl_path: Optional[str]
+    ) -> List[Tuple[float, dict]]:
+        """BM25 检索；会话不在本进程录制时先从 JSONL 建立索引"""
+        try:
+            if session_id and jsonl_path and not keyword_index.has_session(session_id):
+                keyword_index.load_jsonl(session_id, jsonl_path)
+            return keyword_index.search(query, limit=limit, session_id=session_id)
+        except Exception as e:
+            logger.error(f"关键词检索失败: {e}")
             return []
 
     def clean_jsonl_content(self, items):
@@ -168,13 +248,40 @@ class RAGProcessor:
 
         return cleaned_items
 
+    def _realtime_markdown(self, jsonl_path: Optional[str], session_id: Optional[str]) -> str:
+        """实时文本：优先读取进程内 TranscriptStore，无法覆盖时回退读取 JSONL"""
+        if session_id and transcript_store.has_session(session_id):
+            store_file = transcript_store.get_log_file(session_id)
+            if not jsonl_path or not store_file or Path(store_file).resolve() == Path(jsonl_path).resolve():
+                rows = transcript_store.get_recent(session_id, config.TRANSCRIPT_STORE_SIZE)
+                if rows is not None:
+                    return self._items_to_markdown(self._clean_tail(reversed(rows), limit=30))
+        return self.jsonl_to_markdown(jsonl_path) if jsonl_path else "无实时文本"
+
+    def _clean_tail(self, items_newest_first, limit: int = 30) -> List[dict]:
+        """按从新到旧遍历，凑够 limit 条清洗后非空的记录即停止（按时间顺序返回）"""
+        items: List[dict] = []
+        for item in items_newest_first:
+            items.extend(self.clean_jsonl_content([item]))
+            if len(items) >= limit:
+                break
+        items.reverse()
+        return items
+
+    def _tail_cleaned_items(self, jsonl_path: str, limit: int = 30) -> List[dict]:
+        """从文件末尾倒序读取，凑够 limit 条清洗后非空的记录即停止"""
+        try:
+            return self._clean_tail(iter_jsonl_reverse(jsonl_path), limit=limit)
+        except FileNotFoundError:
+            return []
+
     def jsonl_to_markdown(self, jsonl_path: str):
         """JSONL转Markdown表格"""
-        items = self._read_jsonl(jsonl_path)
-        cleaned_items = self.clean_jsonl_content(items)
+        return self._items_to_markdown(self._tail_cleaned_items(jsonl_path, limit=30))
 
+    def _items_to_markdown(self, cleaned_items: List[dict]) -> str:
         md_table = ["| id | 时间区间 | 文本 |", "|---|---|---|"]
-        for idx, item in enumerate(cleaned_items[-30:], 1):  # 只显示最后10条
+        for idx, item in enumerate(cleaned_items, 1):  # 只显示最后30条
             start_ts = item.get("start")
             end_ts = item.get("end")
 
@@ -198,12 +305,19 @@ class RAGProcessor:
     ) -> str:
         """生成回答"""
         try:
-            messages, memory = self._prepare_prompt(question, jsonl_path, session_id)
+            vector = self._embed_question(question)
+            cached, scope = self._lookup_answer(question, jsonl_path, session_id, vector)
+            if cached is not None:
+                logger.info("命中回答缓存")
+                self._remember(session_id, question, cached, vector)
+                return cached
+
+            messages, _ = self._prepare_prompt(question, jsonl_path, session_id, vector)
             model = self.model_manager.get_model()
             response = model.invoke(messages)
             answer = getattr(response, "content", str(response))
-            memory.chat_memory.add_user_message(question)
-            memory.chat_memory.add_ai_message(answer)
+            self._remember(session_id, question, answer, vector)
+            self._store_answer(scope, vector, answer)
             return answer
 
         except Exception as e:
@@ -218,17 +332,22 @@ class RAGProcessor:
     ) -> Iterator[str]:
         """生成流式回答，每次迭代返回一段文本。"""
 
-        messages, memory = self._prepare_prompt(question, jsonl_path, session_id)
+        vector = self._embed_question(question)
+        cached, scope = self._lookup_answer(question, jsonl_path, session_id, vector)
+        if cached is not None:
+            logger.info("命中回答缓存，回放缓存回答")
+            step = max(1, config.ANSWER_REPLAY_CHARS)
+            for i in range(0, len(cached), step):
+                yield cached[i:i + step]
+            self._remember(session_id, question, cached, vector)
+            return
+
+        messages, _ = self._prepare_prompt(question, jsonl_path, session_id, vector)
         model = self.model_manager.get_model()
         collected: List[str] = []
         try:
             for chunk in model.stream(messages):
-                content = getattr(chunk, "content", None)
-                if not content and hasattr(chunk, "delta"):
-                    content = getattr(chunk, "delta", None)
-                if not content:
-                    additional = getattr(chunk, "additional_kwargs", {})
-                    content = additional.get("content") if isinstance(additional, dict) else None
+                content = self._chunk_content(chunk)
                 if not content:
                     continue
                 collected.append(content)
@@ -238,8 +357,115 @@ class RAGProcessor:
             raise
 
         answer = "".join(collected)
+        self._remember(session_id, question, answer, vector)
+        self._store_answer(scope, vector, answer)
+
+    @staticmethod
+    def _chunk_content(chunk) -> Optional[str]:
+        """从流式输出块中取出文本"""
+        content = getattr(chunk, "content", None)
+        if not content and hasattr(chunk, "delta"):
+            content = getattr(chunk, "delta", None)
+        if not content:
+            additional = getattr(chunk, "additional_kwargs", {})
+            content = additional.get("content") if isinstance(additional, dict) else None
+        return content
+
+    def _remember(
+            self, session_id: Optional[str], question: str, answer: str, vector: Optional[List[float]] = None
+    ) -> None:
+        memory = self._get_memory(session_id)
         memory.chat_memory.add_user_message(question)
         memory.chat_memory.add_ai_message(answer)
+        if vector is not None:
+            vectors = self.turn_vectors.setdefault(self._memory_key(session_id), {})
+            vectors.pop(normalize_question(question), None)
+            vectors[normalize_question(question)] = list(vector)
+            while len(vectors) > 16:
+                vectors.pop(next(iter(vectors)))
+
+    # ------------------------------------------------------------------
+    # Asyncio path
+    # ------------------------------------------------------------------
+
+    async def _aprepare(
+            self, question: str, jsonl_path: Optional[str], session_id: Optional[str]
+    ) -> Tuple[Optional[str], Optional[tuple], Optional[List[float]], Optional[List[BaseMessage]]]:
+        """问题只向量化一次：先查回答缓存，未命中再并发执行检索与实时文本构建
+
+        返回 (缓存回答, 缓存作用域, 问题向量, 提示消息)；命中缓存时提示消息为 None。
+        线程中的检索无法中途取消，因此在缓存查询之后才启动，命中时不做多余的检索。
+        """
+        vector = await asyncio.to_thread(self._embed_question, question)
+        cached, scope = await asyncio.to_thread(self._lookup_answer, question, jsonl_path, session_id, vector)
+        if cached is not None:
+            return cached, scope, vector, None
+
+        context_text, realtime_text = await asyncio.gather(
+            asyncio.to_thread(self._context_text, question, jsonl_path, session_id, vector),
+            asyncio.to_thread(self._realtime_text, jsonl_path, session_id),
+        )
+        messages, _ = self._build_messages(question, session_id, context_text, realtime_text)
+        return None, scope, vector, messages
+
+    async def agenerate_response(
+            self,
+            question: str,
+            jsonl_path: Optional[str] = None,
+            session_id: Optional[str] = None,
+    ) -> str:
+        """异步生成回答"""
+        try:
+            cached, scope, vector, messages = await self._aprepare(question, jsonl_path, session_id)
+            if cached is not None:
+                logger.info("命中回答缓存")
+                self._remember(session_id, question, cached, vector)
+                return cached
+
+            model = self.model_manager.get_model()
+            response = await model.ainvoke(messages)
+            answer = getattr(response, "content", str(response))
+            self._remember(session_id, question, answer, vector)
+            self._store_answer(scope, vector, answer)
+            return answer
+
+        except Exception as e:
+            logger.error(f"回答生成失败: {e}")
+            return "抱歉，生成回答时出现错误。"
+
+    async def agenerate_response_stream(
+            self,
+            question: str,
+            jsonl_path: Optional[str] = None,
+            session_id: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        """异步生成流式回答，每次迭代返回一段文本。"""
+
+        cached, scope, vector, messages = await self._aprepare(question, jsonl_path, session_id)
+        if cached is not None:
+            logger.info("命中回答缓存，回放缓存回答")
+            step = max(1, config.ANSWER_REPLAY_CHARS)
+            for i in range(0, len(cached), step):
+                yield cached[i:i + step]
+            self._remember(session_id, question, cached, vector)
+            return
+
+        model = self.model_manager.get_model()
+        collected: List[str] = []
+        try:
+            async for chunk in model.astream(messages):
+                content = self._chunk_content(chunk)
+                if not content:
+                    continue
+                collected.append(content)
+                yield content
+        except Exception as exc:
+            logger.error("流式生成回答失败: %s", exc, exc_info=True)
+            raise
+
+        answer = "".join(collected)
+        self._remember(session_id, question, answer, vector)
+        self._store_answer(scope, vector, answer)
 
     def get_history(
             self, session_id: Optional[str] = None, limit: int = 20
@@ -20,6 +20,8 @@ class BatchTranscript(TranscriptBase):
     """批量转录条目"""
     batch_index: int
     count: int
+    segment_ids: list[int]
+    tokens: int
     combined_text: str
     type: str = "batch_speech"
 
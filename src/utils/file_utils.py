@@ -1,7 +1,7 @@
 import os
 import json
 from pathlib import Path
-from typing import List, Any, Optional
+from typing import List, Any, Iterator, Optional
 import datetime
 from uuid import uuid5, NAMESPACE_DNS
 
@@ -29,6 +29,75 @@ def get_next_id(log_file: str) -> int:
         return 1
 
 
+def _parse_jsonl_line(line: bytes) -> Optional[dict]:
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        payload = json.loads(line.decode("utf-8"))
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        return None
+    return payload if isinstance(payload, dict) else None
+
+
+def iter_jsonl_reverse(file_path: str, block_size: int = 8192) -> Iterator[dict]:
+    """从文件末尾向前逐块读取，按从新到旧的顺序逐行解析 JSONL
+
+    只读取实际遍历到的部分，取“最后 N 行”的代价与文件总大小无关；
+    空行、损坏行以及尚未写完的末行会被跳过。
+    """
+    with open(file_path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        remainder = b""
+        while pos > 0:
+            size = min(block_size, pos)
+            pos -= size
+            f.seek(pos)
+            lines = (f.read(size) + remainder).split(b"\n")
+            # 第一段可能是被块边界截断的行，留到下一轮拼接
+            remainder = lines[0]
+            for line in reversed(lines[1:]):
+                payload = _parse_jsonl_line(line)
+                if payload is not None:
+                    yield payload
+        payload = _parse_jsonl_line(remainder)
+        if payload is not None:
+            yield payload
+
+
+def tail_jsonl(file_path: str, limit: int) -> List[dict]:
+    """读取 JSONL 最后 limit 条记录（按文件顺序返回）"""
+    if limit <= 0 or not os.path.exists(file_path):
+        return []
+    rows = []
+    for payload in iter_jsonl_reverse(file_path):
+        rows.append(payload)
+        if len(rows) >= limit:
+            break
+    rows.reverse()
+    return rows
+
+
+def read_jsonl_since(file_path: str, since_id: int, limit: Optional[int] = None) -> List[dict]:
+    """读取 id 大于 since_id 的记录（依赖 id 单调递增），limit 限制返回最早的条数，
+    调用方以最后一条的 id 作为下一次的 since_id 继续读取"""
+    if not os.path.exists(file_path):
+        return []
+    rows = []
+    for payload in iter_jsonl_reverse(file_path):
+        try:
+            if int(payload.get("id", 0)) <= since_id:
+                break
+        except (TypeError, ValueError):
+            continue
+        rows.append(payload)
+    rows.reverse()
+    if limit is not None:
+        rows = rows[:max(0, limit)]
+    return rows
+
+
 def load_json(json_file: str) -> List[Any]:
     """加载JSON文件"""
     if not os.path.exists(json_file):
@@ -36,13 +105,9 @@ def load_json(json_file: str) -> List[Any]:
 
     items = []
     try:
-        with open(json_file, "r", encoding="utf-8") as fr:
-            lines = fr.readlines()
-
-        tail = lines[-10:]  # 只读取最后10行
-        for line in tail:
+        tail = tail_jsonl(json_file, 10)  # 只读取最后10行
+        for payload in tail:
             try:
-                payload = json.loads(line)
                 id_val = payload.get("id", 1)
                 session_id = payload.get("session_id", "default")
                 pid = str(uuid5(NAMESPACE_DNS, f"{session_id}-{id_val}"))
@@ -0,0 +1,104 @@
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from config.settings import config
+
+
+class _SessionBuffer:
+    """单个会话的最近片段"""
+
+    def __init__(self, log_file: Optional[str], maxlen: int):
+        self.log_file = log_file
+        self.rows: Deque[dict] = deque(maxlen=maxlen)
+        self.dropped = 0  # 被环形队列挤出的条数
+        self.version = 0  # 最近一次变化时的全局版本号
+
+
+class TranscriptStore:
+    """进程内转录缓存
+
+    按会话保存最近片段的有界环形队列（线程安全），并维护全局单调递增的版本号：开始新的
+    转录文件或发布记录时加一。片段 id 在每个转录文件内从 1 开始，版本号则跨文件、跨会话
+    不会重复，可作为读者（如回答缓存）判断内容是否变化的标记。
+    录音端写入 JSONL 后同步发布到这里，RAG 与 Web 读取最近片段时无需访问磁盘；
+    JSONL 仍是持久化日志，缓存无法覆盖请求范围时（返回 None）由调用方回退读文件。
+    """
+
+    def __init__(self, maxlen: Optional[int] = None):
+        self.maxlen = maxlen or config.TRANSCRIPT_STORE_SIZE
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, _SessionBuffer] = {}
+        self._version = 0
+
+    def open_session(self, session_id: str, log_file: Optional[str] = None) -> None:
+        """开始一个新的转录文件：清空该会话缓存并记录对应的 JSONL 路径"""
+        with self._lock:
+            buffer = self._sessions[session_id] = _SessionBuffer(log_file, self.maxlen)
+            self._version += 1
+            buffer.version = self._version
+
+    def publish(self, row: dict) -> None:
+        """发布一条已落盘的记录"""
+        session_id = row.get("session_id")
+        with self._lock:
+            buffer = self._sessions.get(session_id)
+            if buffer is None:
+                buffer = self._sessions[session_id] = _SessionBuffer(None, self.maxlen)
+            if len(buffer.rows) == buffer.rows.maxlen:
+                buffer.dropped += 1
+            buffer.rows.append(dict(row))
+            self._version += 1
+            buffer.version = self._version
+
+    def has_session(self, session_id: Optional[str]) -> bool:
+        with self._lock:
+            return session_id in self._sessions
+
+    def get_log_file(self, session_id: Optional[str]) -> Optional[str]:
+        with self._lock:
+            buffer = self._sessions.get(session_id)
+            return buffer.log_file if buffer else None
+
+    def get_session_version(self, session_id: Optional[str]) -> int:
+        """会话最近一次变化时的全局版本号（未知会话为 0）"""
+        with self._lock:
+            buffer = self._sessions.get(session_id)
+            return buffer.version if buffer else 0
+
+    def get_last_id(self, session_id: Optional[str]) -> Optional[int]:
+        with self._lock:
+            buffer = self._sessions.get(session_id)
+            if not buffer or not buffer.rows:
+                return None
+            return buffer.rows[-1].get("id")
+
+    def get_recent(self, session_id: Optional[str], limit: int) -> Optional[List[dict]]:
+        """返回最近 limit 条记录的副本；缓存无法完整覆盖时返回 None"""
+        with self._lock:
+            buffer = self._sessions.get(session_id)
+            if buffer is None:
+                return None
+            if limit > len(buffer.rows) and buffer.dropped:
+                return None
+            start = max(0, len(buffer.rows) - limit)
+            return [dict(row) for row in list(buffer.rows)[start:]]
+
+    def get_since(self, session_id: Optional[str], since_id: int,
+                  limit: Optional[int] = None) -> Optional[List[dict]]:
+        """返回 id 大于 since_id 的记录副本（limit 限制为最早的条数，便于按游标继续读取）；
+        缓存已挤出 since_id 之后的记录时返回 None"""
+        with self._lock:
+            buffer = self._sessions.get(session_id)
+            if buffer is None:
+                return None
+            if buffer.dropped and (not buffer.rows or int(buffer.rows[0].get("id", 0)) > since_id + 1):
+                return None
+            rows = [row for row in buffer.rows if int(row.get("id", 0)) > since_id]
+            if limit is not None:
+                rows = rows[:max(0, limit)]
+            return [dict(row) for row in rows]
+
+
+# 全局转录缓存实例
+transcript_store = TranscriptStore()
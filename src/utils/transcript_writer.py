@@ -0,0 +1,88 @@
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Optional
+
+from config.settings import config
+from .file_utils import ensure_directory, get_next_id
+
+
+class TranscriptWriter:
+    """会话转录 JSONL 写入器
+
+    每个会话只打开一次文件句柄，id 在内存中自增（仅在打开时统计一次已有行数），
+    并按条数批量 flush / fsync，避免每个片段都重新统计行数、重新打开文件。
+    """
+
+    def __init__(self, file_path: str, flush_every: Optional[int] = None, fsync_every: Optional[int] = None):
+        self.file_path = str(file_path)
+        self.flush_every = max(1, flush_every if flush_every is not None else config.TRANSCRIPT_FLUSH_EVERY)
+        self.fsync_every = fsync_every if fsync_every is not None else config.TRANSCRIPT_FSYNC_EVERY
+        self._lock = threading.Lock()
+        self._handle = None
+        self._next_id = 1
+        self._unflushed = 0
+        self._unsynced = 0
+        self.open()
+
+    def open(self) -> None:
+        """打开文件并恢复 id 计数"""
+        with self._lock:
+            if self._handle is not None:
+                return
+            ensure_directory(str(Path(self.file_path).parent))
+            self._next_id = get_next_id(self.file_path)
+            self._handle = open(self.file_path, "a", encoding="utf-8")
+
+    @property
+    def last_id(self) -> int:
+        """最近写入的 id（尚未写入时为 0）"""
+        with self._lock:
+            return self._next_id - 1
+
+    def append(self, data: dict) -> dict:
+        """分配 id 并追加一行，返回带 id 的完整记录"""
+        with self._lock:
+            if self._handle is None:
+                raise ValueError(f"转录文件未打开: {self.file_path}")
+            row = {"id": self._next_id, **{k: v for k, v in data.items() if k != "id"}}
+            self._handle.write(json.dumps(row, ensure_ascii=False))
+            self._handle.write("\n")
+            self._next_id += 1
+
+            self._unflushed += 1
+            self._unsynced += 1
+            if self._unflushed >= self.flush_every:
+                self._flush_locked(sync=bool(self.fsync_every) and self._unsynced >= self.fsync_every)
+            return row
+
+    def flush(self, sync: bool = False) -> None:
+        """将缓冲写入文件（sync=True 时同时 fsync 落盘）"""
+        with self._lock:
+            if self._handle is not None:
+                self._flush_locked(sync)
+
+    def _flush_locked(self, sync: bool) -> None:
+        self._handle.flush()
+        self._unflushed = 0
+        if sync:
+            os.fsync(self._handle.fileno())
+            self._unsynced = 0
+
+    def close(self) -> None:
+        """落盘并关闭文件句柄"""
+        with self._lock:
+            if self._handle is None:
+                return
+            try:
+                self._flush_locked(sync=self._unsynced > 0)
+            finally:
+                self._handle.close()
+                self._handle = None
+
+    def __enter__(self) -> "TranscriptWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
@@ -0,0 +1,89 @@
+import math
+from types import SimpleNamespace
+
+from src.llm.answer_cache import SemanticAnswerCache, history_fingerprint, normalize_question
+
+
+def _human(text):
+    return SimpleNamespace(type="human", content=text)
+
+
+def _ai(text):
+    return SimpleNamespace(type="ai", content=text)
+
+
+class _Session:
+    """按 RAGProcessor 的顺序：查询缓存 -> 未命中则生成并写入 -> 本轮问答及问题向量加入历史"""
+
+    def __init__(self, cache, history=None):
+        self.cache = cache
+        self.history = list(history or [])
+        self.turn_vectors = {}
+
+    def ask(self, question, vector, generate):
+        fingerprint = history_fingerprint(
+            self.history, question, vector=vector, turn_vectors=self.turn_vectors,
+            threshold=self.cache.threshold,
+        )
+        scope = ("lesson", 7, fingerprint)
+        answer = self.cache.lookup(scope, vector)
+        hit = answer is not None
+        if not hit:
+            answer = generate()
+            self.cache.store(scope, vector, answer)
+        self.history.extend([_human(question), _ai(answer)])
+        self.turn_vectors[normalize_question(question)] = vector
+        return answer, hit
+
+
+def test_same_question_twice_hits():
+    cache = SemanticAnswerCache(maxsize=8, ttl=0, threshold=0.95)
+    session = _Session(cache, [_human("什么是TE波"), _ai("横电波")])
+    vector = [1.0, 0.0]
+
+    first, first_hit = session.ask("坡印廷矢量是什么", vector, lambda: "能流密度")
+    second, second_hit = session.ask(" 坡印廷矢量是什么 ", vector, lambda: "不应再次生成")
+    third, third_hit = session.ask("坡印廷矢量是什么", vector, lambda: "不应再次生成")
+
+    assert not first_hit
+    assert second_hit and second == first
+    assert third_hit and third == first
+    assert cache.get_stats()["hits"] == 2
+
+
+def test_near_duplicate_question_hits():
+    cache = SemanticAnswerCache(maxsize=8, ttl=0, threshold=0.95)
+    session = _Session(cache)
+    angle = 0.03  # 余弦约 0.9996
+    near = [math.cos(angle), math.sin(angle)]
+
+    first, first_hit = session.ask("坡印廷矢量是什么", [1.0, 0.0], lambda: "能流密度")
+    second, second_hit = session.ask("坡印廷矢量是什么？", near, lambda: "不应再次生成")
+    third, third_hit = session.ask("坡印廷矢量是啥", [1.0, 0.0], lambda: "不应再次生成")
+
+    assert not first_hit
+    assert second_hit and second == first
+    assert third_hit and third == first
+
+
+def test_new_turn_changes_scope():
+    cache = SemanticAnswerCache(maxsize=8, ttl=0, threshold=0.95)
+    session = _Session(cache)
+    vector = [1.0, 0.0]
+
+    session.ask("坡印廷矢量是什么", vector, lambda: "能流密度")
+    session.ask("什么是TE波", [0.0, 1.0], lambda: "横电波")
+    _, hit = session.ask("坡印廷矢量是什么", vector, lambda: "重新生成")
+
+    assert not hit
+
+
+def test_fingerprint_ignores_only_matching_trailing_turn():
+    base = [_human("什么是TE波"), _ai("横电波")]
+    repeated = base + [_human("坡印廷矢量是什么"), _ai("能流密度")]
+    turn_vectors = {"坡印廷矢量是什么": [1.0, 0.0]}
+
+    assert history_fingerprint(repeated, "坡印廷矢量是什么") == history_fingerprint(base, "坡印廷矢量是什么")
+    assert history_fingerprint(
+        repeated, "什么是TM波", vector=[0.0, 1.0], turn_vectors=turn_vectors, threshold=0.95
+    ) != history_fingerprint(base, "什么是TM波")
@@ -0,0 +1,75 @@
+import numpy as np
+import pytest
+
+from config.settings import config
+from src.embedding.local_vector_store import LocalVectorStore
+
+
+def _point(point_id, vector, session_id="lesson", **payload):
+    return point_id, vector, {"session_id": session_id, "id": point_id, **payload}
+
+
+def test_upsert_search_reload(tmp_path):
+    store = LocalVectorStore(dimension=3, root=str(tmp_path))
+    store.upsert_vectors([
+        _point("a", [1.0, 0.0, 0.0], text="坡印廷矢量"),
+        _point("b", [0.0, 1.0, 0.0], text="TE波"),
+        _point("c", [0.0, 0.0, 2.0], session_id="other", text="TM波"),
+    ])
+    store.upsert_vector("b", [0.0, 0.9, 0.1], {"session_id": "lesson", "id": "b", "text": "TE波（更新）"})
+
+    hits = store.search([0.1, 1.0, 0.0], limit=2, session_id="lesson")
+    assert [hit["id"] for hit in hits] == ["b", "a"]
+    assert hits[0]["text"] == "TE波（更新）"
+    store.close()
+
+    reloaded = LocalVectorStore(dimension=3, root=str(tmp_path))
+    assert [hit["id"] for hit in reloaded.search([0.1, 1.0, 0.0], limit=2, session_id="lesson")] == ["b", "a"]
+    assert [hit["id"] for hit in reloaded.search([0.0, 0.0, 1.0], limit=1)] == ["c"]
+    reloaded.close()
+
+
+def test_reopen_without_close_keeps_rows(tmp_path):
+    # 与 EmbeddingManager 相同的 wait 取值；应用退出时不会调用 close
+    store = LocalVectorStore(dimension=2, root=str(tmp_path))
+    for i in range(5):
+        store.upsert_vectors([_point(f"p{i}", [1.0, i / 10])], wait=config.QDRANT_UPSERT_WAIT)
+    assert len(store.search([1.0, 0.0], limit=10, session_id="lesson")) == 5
+
+    reloaded = LocalVectorStore(dimension=2, root=str(tmp_path))
+    assert len(reloaded.search([1.0, 0.0], limit=10, session_id="lesson")) == 5
+    reloaded.close()
+
+
+def test_embedding_manager_writes_survive_reopen(tmp_path):
+    pytest.importorskip("langchain_huggingface")
+    from src.embedding.embedding_manager import EmbeddingManager
+
+    manager = EmbeddingManager.__new__(EmbeddingManager)  # 跳过模型加载，只走写入路径
+    manager.vector_store = LocalVectorStore(dimension=2, root=str(tmp_path))
+    manager.embed_documents = lambda texts: [[1.0, float(i)] for i in range(len(texts))]
+    manager._process_embedding_items([
+        (f"片段{i}", {"session_id": "lesson", "id": i}, "lesson", i) for i in range(5)
+    ])
+
+    reloaded = LocalVectorStore(dimension=2, root=str(tmp_path))
+    assert len(reloaded.search([1.0, 0.0], limit=10, session_id="lesson")) == 5
+    reloaded.close()
+
+
+def test_partial_batch_dropped_on_reload(tmp_path):
+    store = LocalVectorStore(dimension=2, root=str(tmp_path))
+    store.upsert_vectors([_point("a", [1.0, 0.0])])
+    # 只写入不提交，模拟进程在一批写到一半时退出
+    index = store._get_index(config.QDRANT_COLLECTION, "lesson")
+    index.upsert("b", np.array([0.0, 1.0], dtype=np.float32), {"session_id": "lesson", "id": "b"})
+    index._points.flush()
+
+    reloaded = LocalVectorStore(dimension=2, root=str(tmp_path))
+    assert [hit["id"] for hit in reloaded.search([0.0, 1.0], limit=5, session_id="lesson")] == ["a"]
+
+    reloaded.upsert_vectors([_point("c", [0.0, 1.0])])
+    reloaded.close()
+    again = LocalVectorStore(dimension=2, root=str(tmp_path))
+    assert [hit["id"] for hit in again.search([0.0, 1.0], limit=5, session_id="lesson")] == ["c", "a"]
+    again.close()
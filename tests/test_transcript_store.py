@@ -0,0 +1,53 @@
+import json
+
+from src.utils.file_utils import read_jsonl_since
+from src.utils.transcript_store import TranscriptStore
+
+
+def _rows(count, session_id="lesson"):
+    return [{"id": i, "session_id": session_id, "text": f"片段{i}"} for i in range(1, count + 1)]
+
+
+def test_get_since_pages_forward_from_cursor():
+    store = TranscriptStore(maxlen=100)
+    store.open_session("lesson")
+    for row in _rows(60):
+        store.publish(row)
+
+    first = store.get_since("lesson", 0, limit=50)
+    assert [row["id"] for row in first] == list(range(1, 51))
+    second = store.get_since("lesson", first[-1]["id"], limit=50)
+    assert [row["id"] for row in second] == list(range(51, 61))
+
+
+def test_get_since_falls_back_when_rows_were_dropped():
+    store = TranscriptStore(maxlen=10)
+    store.open_session("lesson")
+    for row in _rows(30):
+        store.publish(row)
+
+    assert store.get_since("lesson", 5, limit=5) is None
+    assert [row["id"] for row in store.get_since("lesson", 25, limit=3)] == [26, 27, 28]
+
+
+def test_read_jsonl_since_pages_forward(tmp_path):
+    path = tmp_path / "lesson.jsonl"
+    path.write_text("".join(json.dumps(row, ensure_ascii=False) + "\n" for row in _rows(60)), encoding="utf-8")
+
+    first = read_jsonl_since(str(path), 10, limit=20)
+    assert [row["id"] for row in first] == list(range(11, 31))
+    assert [row["id"] for row in read_jsonl_since(str(path), 50)] == list(range(51, 61))
+
+
+def test_session_version_is_monotonic_across_restarts():
+    store = TranscriptStore(maxlen=10)
+    store.open_session("lesson", "first.jsonl")
+    store.publish(_rows(1)[0])
+    before = store.get_session_version("lesson")
+
+    # 重新开始同名课程：片段 id 从 1 重新计数，版本号不会回到之前的值
+    store.open_session("lesson", "second.jsonl")
+    store.publish(_rows(1)[0])
+    assert store.get_last_id("lesson") == 1
+    assert store.get_session_version("lesson") > before
+    assert store.get_session_version("unknown") == 0
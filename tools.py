@@ -1,58 +1,44 @@
-from qdrant_client import QdrantClient
 from qdrant_client.models import PointStruct, VectorParams, Distance
-from langchain_huggingface import HuggingFaceEmbeddings
-from config.settings import config
-from qdrant_client.models import Filter, FieldCondition, MatchValue
 import sounddevice as sd
-from config.settings import config
+from src.embedding.embedding_manager import get_embedding_manager
+from src.embedding.qdrant_client import QdrantManager
 
-client = QdrantClient(host="localhost", port=6333)
+_qdrant_manager = None
+
+
+def get_qdrant_manager() -> QdrantManager:
+    """懒加载共享的 QdrantManager（复用其连接池）"""
+    global _qdrant_manager
+    if _qdrant_manager is None:
+        _qdrant_manager = QdrantManager()
+    return _qdrant_manager
 
 
 def creat_collection(collection_name):
-    client.recreate_collection(
-        collection_name="test_collection",
-        vectors_config=VectorParams(size=4, distance=Distance.COSINE)  # 向量维度=4
-    )
+    with get_qdrant_manager().acquire_client() as client:
+        client.recreate_collection(
+            collection_name="test_collection",
+            vectors_config=VectorParams(size=4, distance=Distance.COSINE)  # 向量维度=4
+        )
     return ()
 
 
 def search_collection(collection_name, q):
-    embedding_model = HuggingFaceEmbeddings(
-        model_name=r"C:\Users\xiaojia\Desktop\study-agent-master\data\models\embedding\bge-small-zh-v1.5",  # 直接使用字符串
-        model_kwargs={"device": "cpu"},
-        encode_kwargs={"normalize_embeddings": True},
-    )
-
-    flt = Filter(
-        must=[FieldCondition(key="session_id", match=MatchValue(value="高等数学"))]
-    )
-
-    q = embedding_model.embed_query(q)
-    search_result = client.query_points(
-        collection_name=collection_name,
-        query=q,  # 向量本体
-        using="text",  # 指定命名向量的名字
-        limit=5,
-        query_filter=flt,
-        with_payload=True,
-        with_vectors=False,
+    # 使用共享嵌入服务（带查询向量缓存）
+    embedding_manager = get_embedding_manager()
+    q = embedding_manager.embed_query(q)
+    payloads = embedding_manager.vector_store.search(
+        q, limit=5, session_id="高等数学", collection_name=collection_name
     )
 
-    for p in search_result.points:
-        print(p.payload.get("text"))
+    for payload in payloads:
+        print(payload.get("text"))
 
 
 def delete_collection(collection_name):
-    return client.delete_collection(collection_name)
-
+    with get_qdrant_manager().acquire_client() as client:
+        return client.delete_collection(collection_name)
 
-def get_hotwords(lesson_name: str,):
-    """根据课名返回热词列表"""
-    for key, words in config.HOTWORDS_DICT.items():
-        if key in lesson_name:
-            return words
-    return []
 
 print(sd.query_devices())
 
@@ -1,39 +1,60 @@
-"""Flask web interface for the realtime transcription and QA system."""
+"""ASGI (Quart) web interface for the realtime transcription and QA system.
+
+SSE answer streams are coroutines on a single event loop; blocking work (model
+loading, recorder control, transcript file access) runs on a bounded thread pool.
+"""
 from __future__ import annotations
 
+import asyncio
+import hashlib
 import json
 import logging
 import sys
 import threading
 import time
-from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Iterator, List, Optional, Tuple
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Set, Tuple, TypeVar
 
-from flask import Flask, Response, jsonify, render_template, request, stream_with_context
+from quart import Quart, Response, jsonify, render_template, request
 
 # Ensure the project root is available for imports when running the app directly.
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
 if str(PROJECT_ROOT) not in sys.path:
     sys.path.insert(0, str(PROJECT_ROOT))
 
+from config.settings import config
 from src.asr.asr_processor import ASRProcessor
 from src.asr.punc_processor import PuncProcessor
 from src.asr.recorder import AudioRecorder
 from src.asr.vad_processor import VADProcessor
 from src.llm.rag_processor import RAGProcessor
-from src.utils.file_utils import ensure_directory, find_jsonl_file
+from src.utils.file_utils import ensure_directory, find_jsonl_file, read_jsonl_since, tail_jsonl
+from src.utils.transcript_store import transcript_store
+from src.asr.hotwords import get_hotwords
 
 logger = logging.getLogger(__name__)
 
-app = Flask(
+app = Quart(
     __name__,
     template_folder=str(Path(__file__).parent / "templates"),
     static_folder=str(Path(__file__).parent / "static"),
 )
 
+# 阻塞调用（模型、录音控制、文件读取）统一放到有界线程池，事件循环只负责 I/O
+_EXECUTOR = ThreadPoolExecutor(max_workers=config.WEB_EXECUTOR_WORKERS, thread_name_prefix="web-blocking")
+
+T = TypeVar("T")
+
+
+async def _run_blocking(fn: Callable[..., T], *args) -> T:
+    """Run a blocking callable on the bounded executor."""
+
+    return await asyncio.get_running_loop().run_in_executor(_EXECUTOR, fn, *args)
+
 
 def _sse_message(payload: Dict[str, object]) -> str:
     """Format payload into a server-sent event message string."""
@@ -41,6 +62,23 @@ def _sse_message(payload: Dict[str, object]) -> str:
     return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
 
 
+def _sse_event(payload: object, event: str, event_id: Optional[str] = None) -> str:
+    """Format a named server-sent event, optionally carrying a resume cursor."""
+
+    lines = [] if event_id is None else [f"id: {event_id}"]
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(payload, ensure_ascii=False)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def _sse_response(body, status: int = 200) -> Response:
+    response = Response(body, mimetype="text/event-stream", status=status)
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+    response.timeout = None  # 流式回答可能持续较长时间
+    return response
+
+
 def _safe_int(value: object) -> Optional[int]:
     try:
         if value is None:
@@ -119,8 +157,74 @@ class TranscriptRow:
         )
 
 
+class TranscriptFeed:
+    """Wake transcript SSE coroutines when the recorder publishes an event.
+
+    Recorder threads call :meth:`notify`; each subscribed stream owns an
+    ``asyncio.Event`` that is set on its own loop, so idle streams simply sleep.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._waiters: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+
+    def notify(self) -> None:
+        with self._lock:
+            waiters = list(self._waiters)
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:  # pragma: no cover - loop already closed
+                continue
+
+    @contextmanager
+    def subscribe(self) -> Iterator[asyncio.Event]:
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._waiters.add(waiter)
+        try:
+            yield waiter[1]
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
+
+
+class LessonSession:
+    """One lesson being recorded: its own recorder, input device, VAD state and transcript."""
+
+    def __init__(self, lesson: str, device: Optional[int], asr_processor: ASRProcessor):
+        self.lesson = lesson
+        self.device = device
+        self.asr_processor = asr_processor
+        # Silero VAD 是有状态的，每路音频一份；ASR/标点/嵌入模型在会话间共享
+        self.vad_processor = VADProcessor()
+        self.recorder = AudioRecorder(device=device)
+        self.thread: Optional[threading.Thread] = None
+        self.started_at: Optional[float] = None
+        self.log_file: Optional[Path] = None
+
+        # 说话过程中的临时识别结果（最终结果落盘后清空）
+        self.partial_segment: Optional[Dict[str, object]] = None
+        self.last_final_seq: int = -1
+
+    @property
+    def is_recording(self) -> bool:
+        return bool(self.recorder and self.recorder.is_recording)
+
+    @property
+    def is_active(self) -> bool:
+        """Recording, or stopped but the recorder thread is still draining queued segments."""
+
+        return self.is_recording or bool(self.thread and self.thread.is_alive())
+
+
 class StudyAgentWebBridge:
-    """Bridge the realtime transcription and QA pipeline into a web friendly API."""
+    """Bridge the realtime transcription and QA pipeline into a web friendly API.
+
+    Several lessons can record at once, keyed by session id (the lesson name).
+    Each owns its recorder, input device, VAD state and transcript writer; the
+    ASR, punctuation and embedding models are loaded once and shared.
+    """
 
     def __init__(self, project_root: Path):
         self.project_root = project_root
@@ -128,21 +232,18 @@ class StudyAgentWebBridge:
         ensure_directory(str(self.project_root / "data" / "logs"))
 
         self.lock = threading.RLock()
-        self.vad_processor = VADProcessor()
         self.asr_processor = ASRProcessor()
         self.punc_processor = PuncProcessor()
         self.asr_processor.punc_processor = self.punc_processor
         self.rag_processor = RAGProcessor()
         self.embedding_manager = self.rag_processor.embedding_manager
 
-        self.recorder: Optional[AudioRecorder] = None
-        self.recording_thread: Optional[threading.Thread] = None
-        self.recording_started_at: Optional[float] = None
-
-        self.current_lesson: Optional[str] = None
+        self.sessions: Dict[str, LessonSession] = {}
+        self._starting: Set[str] = set()  # 正在构建会话（加载 VAD 模型）的课程
         self.last_session_id: Optional[str] = None
         self.last_log_file: Optional[Path] = None
         self.history_limit: int = 20
+        self.feed = TranscriptFeed()
 
     # ------------------------------------------------------------------
     # Session helpers
@@ -150,7 +251,7 @@ class StudyAgentWebBridge:
     @property
     def is_recording(self) -> bool:
         with self.lock:
-            return bool(self.recorder and self.recorder.is_recording)
+            return any(session.is_recording for session in self.sessions.values())
 
     def _resolve_path(self, path: Optional[str]) -> Optional[Path]:
         if not path:
@@ -160,91 +261,179 @@ class StudyAgentWebBridge:
             candidate = self.project_root / candidate
         return candidate
 
-    def start_session(self, lesson: str) -> Tuple[bool, str]:
+    def _recording_sessions(self) -> List[LessonSession]:
+        return [session for session in self.sessions.values() if session.is_recording]
+
+    def _check_start(self, lesson_name: str, device: Optional[int]) -> Optional[Tuple[bool, str]]:
+        """Return the reply when ``lesson_name`` cannot start now (caller holds the lock)."""
+
+        existing = self.sessions.get(lesson_name)
+        if existing and existing.is_recording:
+            self.last_session_id = lesson_name
+            return True, f"课程“{lesson_name}”已经在录制。"
+        if existing and existing.is_active:
+            return False, f"课程“{lesson_name}”上一次录制仍在处理剩余片段，请稍后再试。"
+        if lesson_name in self._starting:
+            return False, f"课程“{lesson_name}”正在启动，请稍候。"
+
+        active = [session for session in self.sessions.values() if session.is_active]
+        if len(active) + len(self._starting) >= config.MAX_SESSIONS:
+            return False, f"最多同时录制 {config.MAX_SESSIONS} 门课程，请先停止其他课程。"
+        for other in active:
+            if other.device == device:
+                return False, f"输入设备 {device} 正在被课程“{other.lesson}”使用。"
+        return None
+
+    def start_session(self, lesson: str, device: Optional[int] = None) -> Tuple[bool, str]:
         lesson_name = lesson.strip()
         if not lesson_name:
             return False, "课程名称不能为空。"
+        device = config.DEVICE if device is None else device
+
+        with self.lock:
+            rejected = self._check_start(lesson_name, device)
+            if rejected:
+                return rejected
+            self._starting.add(lesson_name)
+
+        # 加载 Silero VAD 等较慢的构建放在锁外，避免阻塞其它课程的状态查询
+        try:
+            logger.info("开始课程 %s 的录制（设备 %s）", lesson_name, device)
+            session = LessonSession(
+                lesson_name, device, self.asr_processor.with_hotwords(get_hotwords(lesson_name))
+            )
+        except Exception as exc:
+            logger.error("无法创建课程会话: %s", exc)
+            with self.lock:
+                self._starting.discard(lesson_name)
+            return False, "启动录制失败，请检查模型与音频设备配置。"
 
         with self.lock:
-            if self.recorder and self.recorder.is_recording:
-                if self.current_lesson == lesson_name:
-                    return True, f"课程“{lesson_name}”已经在录制。"
-                return False, f"正在录制课程“{self.current_lesson}”，请先停止后再启动新的课程。"
-
-            logger.info("开始课程 %s 的录制", lesson_name)
-            recorder = AudioRecorder()
-            self.recorder = recorder
-            self.recording_started_at = time.time()
-            self.current_lesson = lesson_name
+            self._starting.discard(lesson_name)
+            rejected = self._check_start(lesson_name, device)
+            if rejected:
+                return rejected
+            session.recorder.add_listener(
+                lambda event, target=session: self._on_transcript_event(target, event)
+            )
+            session.started_at = time.time()
+            self.sessions[lesson_name] = session
             self.last_session_id = lesson_name
-            self.last_log_file = None
             self.rag_processor.reset_memory(lesson_name)
+            self.punc_processor.reset_context(lesson_name)
 
-            # 重置批处理状态，避免历史残留影响新课程。
-            try:
-                self.embedding_manager.batch_buffer.clear()
-                self.embedding_manager.batch_index = 1
-            except Exception:  # pragma: no cover - defensive, attributes 应始终存在
-                pass
+            # 重置该课程的向量化窗口，避免历史残留影响新课程。
+            self.embedding_manager.reset_session(lesson_name)
 
             thread = threading.Thread(
-                target=recorder.start_recording,
+                target=session.recorder.start_recording,
                 kwargs={
-                    "vad_processor": self.vad_processor,
-                    "asr_processor": self.asr_processor,
+                    "vad_processor": session.vad_processor,
+                    "asr_processor": session.asr_processor,
                     "embedding_manager": self.embedding_manager,
                     "lesson_name": lesson_name,
                 },
                 name=f"RecorderThread-{lesson_name}",
                 daemon=True,
             )
-            self.recording_thread = thread
+            session.thread = thread
 
         try:
             thread.start()
         except Exception as exc:  # pragma: no cover - thread start failure is rare
             logger.error("无法启动录音线程: %s", exc)
             with self.lock:
-                self.recorder = None
-                self.recording_thread = None
-                self.recording_started_at = None
-                self.current_lesson = None
+                self.sessions.pop(lesson_name, None)
             return False, "启动录制失败，请检查音频设备配置。"
 
         return True, f"课程“{lesson_name}”开始录制。"
 
-    def stop_session(self) -> Tuple[bool, str]:
+    def stop_session(self, session_id: Optional[str] = None) -> Tuple[bool, str]:
         with self.lock:
-            if not self.recorder or not self.recorder.is_recording:
+            if session_id:
+                session = self.sessions.get(session_id)
+            else:
+                recording = self._recording_sessions()
+                session = self.sessions.get(self.last_session_id or "")
+                if not (session and session.is_recording):
+                    session = recording[0] if len(recording) == 1 else None
+                    if len(recording) > 1:
+                        return False, "有多门课程正在录制，请指定要停止的课程。"
+            if not session or not session.is_recording:
                 return False, "当前没有正在录制的课程。"
 
-            lesson_name = self.current_lesson
+            lesson_name = session.lesson
             logger.info("停止课程 %s 的录制", lesson_name)
-            self.recorder.stop_recording()
-            thread = self.recording_thread
+            session.recorder.stop_recording()
+            thread = session.thread
         if thread:
             thread.join(timeout=2.0)
 
         with self.lock:
-            log_path = self._resolve_path(self.recorder.log_file if self.recorder else None)
+            log_path = self._resolve_path(session.recorder.log_file)
             if log_path and log_path.exists():
+                session.log_file = log_path
                 self.last_log_file = log_path
-            self.recorder = None
-            self.recording_thread = None
-            self.recording_started_at = None
-            if lesson_name:
-                self.last_session_id = lesson_name
-            self.current_lesson = None
+            draining = bool(thread and thread.is_alive())
+            if not draining:
+                # 线程仍在收尾时保留引用，同名课程在其结束前不能重新开始
+                session.thread = None
+            session.partial_segment = None
+            self.last_session_id = lesson_name
+
+        if draining:
+            return True, f"已停止课程“{lesson_name}”的录制，剩余片段仍在后台处理。"
+        return True, f"已停止课程“{lesson_name}”的录制。"
+
+    def _on_transcript_event(self, session: LessonSession, event: dict) -> None:
+        """Track the latest provisional hypothesis; final rows are read from the transcript."""
 
-        lesson_label = lesson_name or "当前课程"
-        return True, f"已停止课程“{lesson_label}”的录制。"
+        seq = _safe_int(event.get("segment_seq"))
+        try:
+            with self.lock:
+                if event.get("final"):
+                    session.last_final_seq = max(session.last_final_seq, seq if seq is not None else -1)
+                    session.partial_segment = None
+                    return
+                if seq is not None and seq <= session.last_final_seq:
+                    return
+                session.partial_segment = {
+                    "segment_seq": seq,
+                    "text": str(event.get("text", "")),
+                    "time_range": TranscriptRow.from_payload(event).time_range,
+                    "duration": _safe_float(event.get("dur")),
+                    "session_id": event.get("session_id"),
+                    "final": False,
+                }
+        finally:
+            self.feed.notify()
 
-    def get_session_id(self) -> Optional[str]:
+    def get_partial_segment(self, session_id: Optional[str] = None) -> Optional[Dict[str, object]]:
         with self.lock:
-            return self.current_lesson or self.last_session_id
+            session = self.sessions.get(self.get_session_id(session_id) or "")
+            if not (session and session.is_recording):
+                return None
+            return dict(session.partial_segment) if session.partial_segment else None
 
-    def get_active_jsonl_path(self) -> Optional[Path]:
-        """Return the most recent transcript file on disk."""
+    def get_session_id(self, session_id: Optional[str] = None) -> Optional[str]:
+        """The requested session, or the most recently started/stopped one."""
+
+        if session_id:
+            return session_id
+        with self.lock:
+            return self.last_session_id
+
+    def get_active_jsonl_path(self, session_id: Optional[str] = None) -> Optional[Path]:
+        """Return the session's transcript file, or the most recent one on disk."""
+
+        target = self.get_session_id(session_id)
+        with self.lock:
+            session = self.sessions.get(target or "")
+            known = self._resolve_path(session.recorder.log_file) if session else None
+        if known is None:
+            known = self._resolve_path(transcript_store.get_log_file(target))
+        if known is not None and known.exists():
+            return known
 
         latest_path = find_jsonl_file(str(self.project_root / "data" / "outputs" / "json"))
         if not latest_path:
@@ -264,28 +453,11 @@ class StudyAgentWebBridge:
     # ------------------------------------------------------------------
     # Data accessors
     # ------------------------------------------------------------------
-    def get_recent_segments(self, limit: int = 50) -> List[TranscriptRow]:
-        jsonl_path = self.get_active_jsonl_path()
-        if not jsonl_path:
-            return []
-
-        buffer: deque[dict] = deque(maxlen=limit)
-        try:
-            with jsonl_path.open("r", encoding="utf-8") as handle:
-                for line in handle:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    try:
-                        payload = json.loads(line)
-                    except json.JSONDecodeError:
-                        continue
-                    buffer.append(payload)
-        except FileNotFoundError:
-            return []
-        except OSError as exc:
-            logger.warning("读取转录文件失败: %s", exc)
-            return []
+    def get_recent_segments(self, limit: int = 50, session_id: Optional[str] = None) -> List[TranscriptRow]:
+        # 录音在本进程内进行时直接读取内存中的 TranscriptStore，无需访问磁盘
+        buffer = transcript_store.get_recent(self.get_session_id(session_id), limit)
+        if buffer is None:
+            buffer = self._read_recent_from_disk(limit, session_id)
 
         rows = []
         for payload in buffer:
@@ -297,20 +469,88 @@ class StudyAgentWebBridge:
         rows.sort(key=lambda item: item.identifier)
         return rows
 
-    def answer_question(self, question: str) -> Tuple[bool, str, List[Dict[str, str]]]:
+    def get_segments_since(
+            self, since_id: int, limit: Optional[int] = None, session_id: Optional[str] = None
+    ) -> List[TranscriptRow]:
+        """The oldest ``limit`` rows newer than ``since_id``, so callers can page forward.
+
+        Served from the in-process store, else from the JSONL tail.
+        """
+
+        buffer = transcript_store.get_since(self.get_session_id(session_id), since_id, limit)
+        if buffer is None:
+            jsonl_path = self.get_active_jsonl_path(session_id)
+            try:
+                buffer = read_jsonl_since(str(jsonl_path), since_id, limit) if jsonl_path else []
+            except OSError as exc:
+                logger.warning("读取转录文件失败: %s", exc)
+                buffer = []
+
+        rows = []
+        for payload in buffer:
+            try:
+                rows.append(TranscriptRow.from_payload(payload))
+            except Exception:  # pragma: no cover - 防御, 单条解析失败不影响整体
+                continue
+        return rows
+
+    def get_transcript_etag(self, session_id: Optional[str] = None) -> Optional[str]:
+        """Validator for /api/transcript built from the last segment id and file size.
+
+        Only ``stat`` is used, never the file contents, so an unchanged poll costs
+        no transcript read at all.
+        """
+
+        target = self.get_session_id(session_id)
+        path = self.get_active_jsonl_path(target)
+        if not path:
+            return None
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+
+        last_id = transcript_store.get_last_id(target)
+        marker = last_id if last_id is not None else stat.st_mtime_ns
+        partial = self.get_partial_segment(target) or {}
+        digest = hashlib.sha1(f"{path}|{partial.get('text', '')}".encode("utf-8")).hexdigest()[:12]
+        return f'W/"{digest}-{marker}-{stat.st_size}"'
+
+    def get_feed_key(self, session_id: Optional[str] = None) -> Tuple[Optional[str], Optional[str]]:
+        """Identify the transcript being streamed; ids restart when it changes."""
+
+        target = self.get_session_id(session_id)
+        return target, transcript_store.get_log_file(target)
+
+    def _read_recent_from_disk(self, limit: int, session_id: Optional[str] = None) -> List[dict]:
+        jsonl_path = self.get_active_jsonl_path(session_id)
+        if not jsonl_path:
+            return []
+
+        try:
+            return tail_jsonl(str(jsonl_path), limit)
+        except FileNotFoundError:
+            return []
+        except OSError as exc:
+            logger.warning("读取转录文件失败: %s", exc)
+            return []
+
+    async def answer_question(
+            self, question: str, session_id: Optional[str] = None
+    ) -> Tuple[bool, str, List[Dict[str, str]]]:
+        session_id = self.get_session_id(session_id)
         cleaned = question.strip()
         if not cleaned:
-            history = self.get_conversation_history()
+            history = self.get_conversation_history(session_id=session_id)
             return False, "请输入想要咨询的问题。", history
 
-        jsonl_path = self.get_active_jsonl_path()
+        jsonl_path = await _run_blocking(self.get_active_jsonl_path, session_id)
         if not jsonl_path:
-            history = self.get_conversation_history()
+            history = self.get_conversation_history(session_id=session_id)
             return False, "当前没有可用的转录内容，请先开始录制课程。", history
 
-        session_id = self.get_session_id()
         try:
-            answer = self.rag_processor.generate_response(
+            answer = await self.rag_processor.agenerate_response(
                 cleaned,
                 str(jsonl_path),
                 session_id=session_id,
@@ -322,46 +562,65 @@ class StudyAgentWebBridge:
             history = self.get_conversation_history(session_id=session_id)
             return False, "生成回答时出现异常，请稍后再试。", history
 
-    def stream_answer(self, question: str) -> Iterator[str]:
+    async def stream_answer(self, question: str, session_id: Optional[str] = None) -> AsyncIterator[str]:
         cleaned = question.strip()
         if not cleaned:
             raise ValueError("请输入想要咨询的问题。")
 
-        jsonl_path = self.get_active_jsonl_path()
+        session_id = self.get_session_id(session_id)
+        jsonl_path = await _run_blocking(self.get_active_jsonl_path, session_id)
         if not jsonl_path:
             raise FileNotFoundError("当前没有可用的转录内容，请先开始录制课程。")
 
-        session_id = self.get_session_id()
-        return self.rag_processor.generate_response_stream(
+        async for chunk in self.rag_processor.agenerate_response_stream(
             cleaned,
             str(jsonl_path),
             session_id=session_id,
-        )
+        ):
+            yield chunk
 
     def get_conversation_history(
             self, session_id: Optional[str] = None, limit: int = 30
     ) -> List[Dict[str, str]]:
-        target_session = session_id or self.get_session_id()
+        target_session = self.get_session_id(session_id)
         return self.rag_processor.get_history(target_session, limit=limit)
 
-    def get_status(self) -> Dict[str, object]:
+    def _session_status(self, session: LessonSession) -> Dict[str, object]:
+        log_path = self._resolve_path(session.recorder.log_file) or session.log_file
+        recording = session.is_recording
+        return {
+            "session_id": session.lesson,
+            "lesson": session.lesson,
+            "recording": recording,
+            "device": session.device,
+            "log_file": str(log_path) if log_path else None,
+            "started_at": (
+                datetime.fromtimestamp(session.started_at).isoformat()
+                if recording and session.started_at
+                else None
+            ),
+            "vad": session.vad_processor.get_stats(),
+        }
+
+    def get_status(self, session_id: Optional[str] = None) -> Dict[str, object]:
+        """Status of the selected session plus a per-session list."""
+
         with self.lock:
-            log_path: Optional[Path] = None
-            if self.recorder and self.recorder.log_file:
-                log_path = self._resolve_path(self.recorder.log_file)
-            elif self.last_log_file:
-                log_path = self.last_log_file
+            target = self.get_session_id(session_id)
+            sessions = [self._session_status(session) for session in self.sessions.values()]
+            selected = next((item for item in sessions if item["session_id"] == target), None)
+            log_file = selected["log_file"] if selected else None
+            if log_file is None and self.last_log_file and not session_id:
+                log_file = str(self.last_log_file)
 
             return {
-                "recording": bool(self.recorder and self.recorder.is_recording),
-                "lesson": self.current_lesson,
-                "session_id": self.current_lesson or self.last_session_id,
-                "log_file": str(log_path) if log_path else None,
-                "started_at": (
-                    datetime.fromtimestamp(self.recording_started_at).isoformat()
-                    if self.recording_started_at
-                    else None
-                ),
+                "recording": bool(selected and selected["recording"]),
+                "lesson": target if selected and selected["recording"] else None,
+                "session_id": target,
+                "log_file": log_file,
+                "started_at": selected["started_at"] if selected else None,
+                "sessions": sessions,
+                "embedding": self.embedding_manager.get_stats(),
             }
 
 
@@ -369,53 +628,196 @@ BRIDGE = StudyAgentWebBridge(PROJECT_ROOT)
 
 
 # ----------------------------------------------------------------------
-# Flask routes
+# Routes
 # ----------------------------------------------------------------------
+@app.before_serving
+async def _install_executor() -> None:
+    # asyncio.to_thread（RAG 并发检索）同样使用这个有界线程池
+    asyncio.get_running_loop().set_default_executor(_EXECUTOR)
+
+
 @app.route("/")
-def index():
-    segments = [row.to_dict() for row in BRIDGE.get_recent_segments(limit=20)]
+async def index():
+    rows = await _run_blocking(BRIDGE.get_recent_segments, 20)
+    segments = [row.to_dict() for row in rows]
     status = BRIDGE.get_status()
     history = BRIDGE.get_conversation_history(limit=40)
-    return render_template(
+    return await render_template(
         "index.html", segments=segments, status=status, history=history
     )
 
 
+def _query_session_id() -> Optional[str]:
+    return request.args.get("session_id") or None
+
+
 @app.get("/api/status")
-def api_status():
-    return jsonify({"success": True, "status": BRIDGE.get_status()})
+async def api_status():
+    return jsonify({"success": True, "status": BRIDGE.get_status(_query_session_id())})
 
 
 @app.post("/api/start")
-def api_start():
-    payload = request.get_json(silent=True) or {}
+async def api_start():
+    payload = await request.get_json(silent=True) or {}
     lesson = str(payload.get("lesson", ""))
-    success, message = BRIDGE.start_session(lesson)
-    status = BRIDGE.get_status()
+    device = _safe_int(payload.get("device"))
+    success, message = await _run_blocking(BRIDGE.start_session, lesson, device)
+    status = BRIDGE.get_status(lesson.strip() or None)
     http_status = 200 if success else 400
     return jsonify({"success": success, "message": message, "status": status}), http_status
 
 
 @app.post("/api/stop")
-def api_stop():
-    success, message = BRIDGE.stop_session()
-    status = BRIDGE.get_status()
+async def api_stop():
+    payload = await request.get_json(silent=True) or {}
+    session_id = str(payload.get("session_id") or "") or None
+    success, message = await _run_blocking(BRIDGE.stop_session, session_id)
+    status = BRIDGE.get_status(session_id)
     http_status = 200 if success else 400
     return jsonify({"success": success, "message": message, "status": status}), http_status
 
 
+def _etag_matches(etag: str) -> bool:
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    candidates = {item.strip() for item in header.split(",")}
+    return "*" in candidates or etag in candidates
+
+
 @app.get("/api/transcript")
-def api_transcript():
+async def api_transcript():
+    limit = request.args.get("limit", default=50, type=int)
+    since_id = request.args.get("since_id", default=None, type=int)
+    session_id = _query_session_id()
+
+    etag = await _run_blocking(BRIDGE.get_transcript_etag, session_id)
+    if etag and _etag_matches(etag):
+        response = Response("", status=304)
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = "no-cache"
+        return response
+
+    has_more = False
+    if since_id is None:
+        rows = await _run_blocking(BRIDGE.get_recent_segments, limit, session_id)
+    else:
+        # 按游标返回最早的 limit 条；多取一条判断是否还需继续翻页
+        rows = await _run_blocking(BRIDGE.get_segments_since, since_id, limit + 1, session_id)
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+    segments = [row.to_dict() for row in rows]
+    response = jsonify(
+        {
+            "success": True,
+            "segments": segments,
+            "partial": BRIDGE.get_partial_segment(session_id),
+            "since_id": since_id,
+            "last_id": segments[-1]["id"] if segments else since_id,
+            "has_more": has_more,
+        }
+    )
+    if etag:
+        response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+def _feed_tag(feed_key: Tuple[Optional[str], Optional[str]]) -> str:
+    """Short hash identifying one transcript file, used as the event id prefix."""
+
+    return hashlib.sha1(f"{feed_key[0]}|{feed_key[1]}".encode("utf-8")).hexdigest()[:12]
+
+
+def _parse_event_id(value: Optional[str]) -> Tuple[Optional[str], Optional[int]]:
+    """Split a ``<feed-tag>:<row id>`` cursor; a bare number has no tag."""
+
+    if not value:
+        return None, None
+    tag, sep, row_id = value.rpartition(":")
+    return (tag if sep else None), _safe_int(row_id)
+
+
+async def _transcript_events(
+        since_id: Optional[int], limit: int, session_id: Optional[str] = None,
+        since_tag: Optional[str] = None,
+) -> AsyncIterator[str]:
+    """Push new transcript rows as they are committed, resuming after ``since_id``.
+
+    Without ``session_id`` the stream follows the most recently started lesson.
+    Row ids restart with every transcript file, so event ids carry the file's
+    tag; a cursor tagged for another file triggers a ``reset``.
+    """
+
+    with BRIDGE.feed.subscribe() as wake:
+        yield f"retry: {int(config.TRANSCRIPT_STREAM_RETRY_MS)}\n\n"
+        feed_key = BRIDGE.get_feed_key(session_id)
+        tag = _feed_tag(feed_key)
+        last_id = transcript_store.get_last_id(feed_key[0])
+        stale_tag = since_tag is not None and since_tag != tag
+        if since_id is not None and (stale_tag or (last_id is not None and since_id > last_id)):
+            # 游标来自之前的转录文件：与新连接一样只回放最近 limit 条
+            since_id = None
+            yield _sse_event({"session_id": feed_key[0]}, "reset")
+        if since_id is None:
+            backlog = await _run_blocking(BRIDGE.get_recent_segments, limit, feed_key[0])
+        else:
+            backlog = await _run_blocking(BRIDGE.get_segments_since, since_id, None, feed_key[0])
+        cursor = since_id or 0
+        last_partial: Optional[Dict[str, object]] = None
+        idle = 0.0
+
+        rows = backlog
+        while True:
+            for row in rows:
+                cursor = max(cursor, row.identifier)
+                yield _sse_event(row.to_dict(), "segment", event_id=f"{tag}:{row.identifier}")
+
+            partial = BRIDGE.get_partial_segment(feed_key[0])
+            if partial != last_partial:
+                last_partial = partial
+                yield _sse_event(partial, "partial")
+
+            try:
+                await asyncio.wait_for(wake.wait(), timeout=config.TRANSCRIPT_STREAM_POLL_S)
+            except asyncio.TimeoutError:
+                # 录音不在本进程时没有通知，靠超时轮询文件；同时作为心跳保持连接
+                idle += config.TRANSCRIPT_STREAM_POLL_S
+                if idle >= config.TRANSCRIPT_STREAM_KEEPALIVE_S:
+                    idle = 0.0
+                    yield ": keepalive\n\n"
+            # 先清除再读取，读取期间到达的通知会留到下一轮
+            wake.clear()
+
+            current_key = BRIDGE.get_feed_key(session_id)
+            if current_key != feed_key:
+                # 新的课程或新的转录文件：id 从 1 重新开始
+                feed_key = current_key
+                tag = _feed_tag(current_key)
+                cursor = 0
+                yield _sse_event({"session_id": current_key[0]}, "reset")
+                rows = await _run_blocking(BRIDGE.get_recent_segments, limit, current_key[0])
+            elif transcript_store.has_session(current_key[0]):
+                rows = BRIDGE.get_segments_since(cursor, None, current_key[0])
+            else:
+                rows = await _run_blocking(BRIDGE.get_segments_since, cursor, None, current_key[0])
+
+
+@app.get("/api/transcript/stream")
+async def api_transcript_stream():
+    since_tag, since_id = _parse_event_id(request.headers.get("Last-Event-ID"))
+    if since_id is None:
+        since_id = request.args.get("since_id", default=None, type=int)
     limit = request.args.get("limit", default=50, type=int)
-    segments = [row.to_dict() for row in BRIDGE.get_recent_segments(limit=limit)]
-    return jsonify({"success": True, "segments": segments})
+    return _sse_response(_transcript_events(since_id, limit, _query_session_id(), since_tag))
 
 
 @app.post("/api/ask")
-def api_ask():
-    payload = request.get_json(silent=True) or {}
+async def api_ask():
+    payload = await request.get_json(silent=True) or {}
     question = str(payload.get("question", ""))
-    success, answer, history = BRIDGE.answer_question(question)
+    session_id = str(payload.get("session_id") or "") or None
+    success, answer, history = await BRIDGE.answer_question(question, session_id)
     status_code = 200 if success else 400
     return (
         jsonify({"success": success, "answer": answer, "history": history}),
@@ -424,40 +826,31 @@ def api_ask():
 
 
 @app.post("/api/ask_stream")
-def api_ask_stream():
-    payload = request.get_json(silent=True) or {}
+async def api_ask_stream():
+    payload = await request.get_json(silent=True) or {}
     question = str(payload.get("question", ""))
+    session_id = BRIDGE.get_session_id(str(payload.get("session_id") or "") or None)
 
     cleaned = question.strip()
     if not cleaned:
-        response = Response(
-            _sse_message({"type": "error", "message": "请输入想要咨询的问题。"}),
-            mimetype="text/event-stream",
-            status=400,
+        return _sse_response(
+            _sse_message({"type": "error", "message": "请输入想要咨询的问题。"}), status=400
         )
-        response.headers["Cache-Control"] = "no-cache"
-        response.headers["X-Accel-Buffering"] = "no"
-        return response
 
-    if not BRIDGE.get_active_jsonl_path():
-        response = Response(
+    if not await _run_blocking(BRIDGE.get_active_jsonl_path, session_id):
+        return _sse_response(
             _sse_message(
                 {
                     "type": "error",
                     "message": "当前没有可用的转录内容，请先开始录制课程。",
                 }
             ),
-            mimetype="text/event-stream",
             status=400,
         )
-        response.headers["Cache-Control"] = "no-cache"
-        response.headers["X-Accel-Buffering"] = "no"
-        return response
 
-    def generate():
-        session_id = BRIDGE.get_session_id()
+    async def generate() -> AsyncIterator[str]:
         try:
-            for chunk in BRIDGE.stream_answer(cleaned):
+            async for chunk in BRIDGE.stream_answer(cleaned, session_id):
                 yield _sse_message({"type": "delta", "content": chunk})
         except Exception as exc:  # pragma: no cover - streaming failure
             logger.error("流式生成回答失败: %s", exc, exc_info=True)
@@ -473,14 +866,9 @@ def api_ask_stream():
         history = BRIDGE.get_conversation_history(session_id=session_id)
         yield _sse_message({"type": "complete", "history": history})
 
-    response = Response(
-        stream_with_context(generate()), mimetype="text/event-stream", status=200
-    )
-    response.headers["Cache-Control"] = "no-cache"
-    response.headers["X-Accel-Buffering"] = "no"
-    return response
+    return _sse_response(generate())
 
 
 if __name__ == "__main__":  # pragma: no cover - script entry point
     logging.basicConfig(level=logging.INFO)
-    app.run(host="0.0.0.0", port=8000, debug=True, use_reloader=False)
+    app.run(host="0.0.0.0", port=8000, debug=False, use_reloader=False)